@@ -0,0 +1,510 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Answers that are expressions in one or more variables
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import re
+import cmath
+import operator
+import __future__
+from random import Random
+from AnswerInterpreter import (ParseError, InvalidTokenError, UnexpectedTokenError,
+                               UnbalancedParenthesesError, DivideByZeroError,
+                               NUMBER_PATTERN, parse_number, skip_spaces)
+
+# numpy lets an expression be evaluated at every sample point in one pass
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# How tightly each operator binds. Powers bind tighter than unary minus,
+# so -x^2 is -(x^2), and group to the right, so x^2^3 is x^(2^3). A
+# function applies to the parentheses right after it before anything else
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2, 'neg': 3, '^': 4}
+FUNCTION_PRECEDENCE = 5
+RIGHT_ASSOCIATIVE = set(['^'])
+
+BINARY = {'+': operator.add, '-': operator.sub, '*': operator.mul,
+          '/': operator.truediv, '^': operator.pow}
+SOURCE_OPERATORS = {'+': '+', '-': '-', '*': '*', '/': '/', '^': '**'}
+
+# Deeper than this, Python's parser can't compile the source for a program
+MAX_SOURCE_DEPTH = 50
+
+# Functions that can be written in an expression, for single numbers and
+# for numpy arrays. Adding 0j turns an imaginary part of -0.0, which
+# arithmetic on complex numbers leaves behind, into 0.0, so sqrt(-4) is 2j
+# and never -2j however the -4 was worked out
+FUNCTIONS = {'sqrt': lambda z: cmath.sqrt(z + 0j), 'exp': cmath.exp,
+             'log': lambda z: cmath.log(z + 0j), 'sin': cmath.sin,
+             'cos': cmath.cos, 'tan': cmath.tan, 'abs': abs,
+             'phase': lambda z: cmath.phase(z + 0j),
+             're': lambda z: z.real, 'im': lambda z: z.imag,
+             'conj': lambda z: z.conjugate()}
+if numpy is not None:
+  ARRAY_FUNCTIONS = {'sqrt': lambda z: numpy.sqrt(z + 0j), 'exp': numpy.exp,
+                     'log': lambda z: numpy.log(z + 0j), 'sin': numpy.sin,
+                     'cos': numpy.cos, 'tan': numpy.tan, 'abs': numpy.abs,
+                     'phase': lambda z: numpy.angle(z + 0j),
+                     're': numpy.real, 'im': numpy.imag, 'conj': numpy.conj}
+
+CONSTANTS = {'pi': complex(cmath.pi), 'e': complex(cmath.e)}
+
+# A function name followed by a parenthesis, a constant, or else a single
+# letter. Names are tried longest first, so exp is never read as e times xp
+NAME_PATTERN = re.compile(
+  '(?:' + '|'.join(sorted(FUNCTIONS, key=len, reverse=True)) + r')(?= *\()|' +
+  '|'.join(sorted(CONSTANTS, key=len, reverse=True)) + '|.')
+
+# A reference to a column of a problem's data, such as %0 or %12
+DATA_PATTERN = re.compile(r'%([0-9]+)')
+
+# Errors that mean an expression has no value at a point
+UNDEFINED = (ZeroDivisionError, OverflowError, ValueError)
+
+# Errors that mean an answer key has no value for a row of data. A %N past
+# the end of the row is one, the same as a division by zero
+ROW_UNDEFINED = UNDEFINED + (IndexError,)
+
+# Two expressions are compared at this many random points
+SAMPLE_COUNT = 16
+SAMPLE_SEED = 0
+
+# Values this close are equal however small the expected value is
+ABSOLUTE_TOLERANCE = 1e-9
+
+# An expression compiled once into a flat postfix program. Each instruction
+# is ('const', value), ('var', name), ('data', column), ('call', function),
+# ('neg', None) or a binary operator with None. Every constant is complex,
+# so arithmetic never falls back to Python's unbounded integers.
+class Expression:
+  def __init__(self, text, program, variables):
+    self.text = text
+    self.program = program
+    self.variables = variables # Sorted tuple of variable names
+    self.samples = {}          # Values at sample points, by (names, count)
+    self.function = None       # The program as a Python function, once built
+
+  # Functions can't be pickled, so the program is rebuilt after unpickling
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['function'] = None
+    return state
+
+  def __str__(self):
+    return self.text
+
+  def __repr__(self):
+    return 'Expression(%r)' % self.text
+
+  # Evaluates the expression with each variable set from points, a dict,
+  # and each %N from data, a row of a problem's data. Both may hold numpy
+  # arrays instead of numbers, to evaluate elementwise in one pass, in
+  # which case vectorized must be set
+  def evaluate(self, points=None, data=None, vectorized=False):
+    functions = ARRAY_FUNCTIONS if vectorized else FUNCTIONS
+    stack = []
+    for op, arg in self.program:
+      if op == 'const':
+        stack.append(arg)
+      elif op == 'data':
+        stack.append(data[arg])
+      elif op == 'var':
+        stack.append(points[arg])
+      elif op == 'call':
+        stack[-1] = functions[arg](stack[-1])
+      elif op == 'neg':
+        stack[-1] = -stack[-1]
+      else:
+        rhs = stack.pop()
+        stack[-1] = BINARY[op](stack[-1], rhs)
+    return stack[0]
+
+  # The value for one row of data, for answer keys made by compile_answer.
+  # A row with no value, or one that overflows to inf, gives nan, as it
+  # does in evaluate_rows, so an answer key works out the same whichever
+  # way it is evaluated
+  def __call__(self, data):
+    if self.function is None:
+      self.function = build_function(self.program)
+    try:
+      value = complex(self.function(None, data))
+    except ROW_UNDEFINED:
+      return float('nan')
+    if cmath.isinf(value) or cmath.isnan(value):
+      return float('nan')
+    return to_number(value)
+
+  # The values for many rows of data, worked out together with numpy.
+  # Rows with no value come out as nan, the same as from __call__, where
+  # numpy would otherwise give inf or a nan imaginary part.
+  # Return: A complex array with one value per row
+  def evaluate_rows(self, rows):
+    rows = numpy.asarray(rows, dtype=complex)
+    if len(rows) == 0:
+      return numpy.zeros(0, dtype=complex)
+    columns = [rows[:, k] for k in range(rows.shape[1])]
+    try:
+      with numpy.errstate(all='ignore'):
+        values = numpy.asarray(self.evaluate(data=columns, vectorized=True), dtype=complex)
+    except ROW_UNDEFINED:
+      values = numpy.asarray(float('nan'), dtype=complex)
+    if values.ndim == 0:
+      values = numpy.repeat(values, len(rows))
+    values[~numpy.isfinite(values)] = float('nan')
+    return values
+
+  # The values at the shared sample points for the variables in names,
+  # remembered so an answer key is only evaluated once
+  def sample(self, names, count=SAMPLE_COUNT):
+    key = (names, count)
+    values = self.samples.get(key)
+    if values is None:
+      points = sample_points(names, count)
+      if numpy is not None:
+        try:
+          with numpy.errstate(all='ignore'):
+            values = numpy.asarray(self.evaluate(points, vectorized=True), dtype=complex)
+        except UNDEFINED:
+          # Only constants are computed outside numpy, so nothing is defined
+          values = numpy.asarray(complex('nan'))
+        if values.ndim == 0:
+          values = numpy.repeat(values, count)
+      else:
+        values = [self.evaluate_safely(dict((name, points[name][k]) for name in names))
+                  for k in range(count)]
+      self.samples[key] = values
+    return values
+
+  # Evaluates at a single point, giving nan where the expression is undefined
+  def evaluate_safely(self, point):
+    try:
+      return complex(self.evaluate(point))
+    except UNDEFINED:
+      return complex('nan')
+
+_point_cache = {}
+
+# Random complex points, one set per variable, the same on every call.
+# Complex points make it very unlikely that two different expressions
+# agree everywhere by coincidence
+def sample_points(names, count=SAMPLE_COUNT):
+  key = (names, count)
+  points = _point_cache.get(key)
+  if points is None:
+    points = {}
+    if numpy is not None:
+      state = numpy.random.RandomState(SAMPLE_SEED)
+      for name in names:
+        points[name] = (state.uniform(-1.5, 1.5, count) +
+                        1j * state.uniform(-1.5, 1.5, count))
+    else:
+      rand = Random(SAMPLE_SEED)
+      for name in names:
+        points[name] = [complex(rand.uniform(-1.5, 1.5), rand.uniform(-1.5, 1.5))
+                        for k in range(count)]
+    _point_cache[key] = points
+  return points
+
+
+
+# Turns a program into a Python function of (points, data) that computes
+# the same thing for single numbers, without stepping through the program
+# on every call. Programs nested too deeply for Python's parser fall back
+# to evaluate
+def build_function(program):
+  namespace = {}
+  stack = [] # Source for each value, and how deeply it nests
+  for op, arg in program:
+    if op == 'const':
+      name = 'c%d' % len(namespace)
+      namespace[name] = arg
+      stack.append((name, 0))
+    elif op == 'data':
+      stack.append(('d[%d]' % arg, 0))
+    elif op == 'var':
+      stack.append(('p[%r]' % arg, 0))
+    elif op == 'call':
+      name = 'f_' + arg
+      namespace[name] = FUNCTIONS[arg]
+      source, depth = stack.pop()
+      stack.append(('%s(%s)' % (name, source), depth + 1))
+    elif op == 'neg':
+      source, depth = stack.pop()
+      stack.append(('(-%s)' % source, depth + 1))
+    else:
+      rhs, right = stack.pop()
+      lhs, left = stack.pop()
+      stack.append(('(%s %s %s)' % (lhs, SOURCE_OPERATORS[op], rhs),
+                    max(left, right) + 1))
+  source, depth = stack[0]
+  if depth > MAX_SOURCE_DEPTH:
+    expression = Expression('', program, ())
+    return lambda p, d: expression.evaluate(p, d)
+  code = compile('lambda p, d: ' + source, '<answer>', 'eval',
+                 __future__.division.compiler_flag, True)
+  return eval(code, namespace)
+
+# Compiles a string such as "2x+1" or "(x-1)(x+2)" into an Expression.
+# Every letter is a variable except i and j, which are the imaginary unit,
+# the constants e and pi, and functions such as sqrt and exp, which need
+# parentheses. Letters, numbers and parentheses written next to each other
+# are multiplied, so 2xy is 2*x*y. If variables is given, any other letter
+# is an error. With data set, %0, %1 and so on stand for a problem's data.
+# Raises a ParseError if the string can't be compiled
+def compile_expression(text, variables=None, data=False):
+  try:
+    program = parse(text, variables, data)
+  except ParseError, e:
+    e.query = text
+    if e.position is None:
+      e.position = len(text)
+    raise
+  names = tuple(sorted(set(arg for op, arg in program if op == 'var')))
+  return Expression(text, program, names)
+
+# Compiles an answer key written in terms of a problem's data, such as
+# "(-%1 + sqrt(%1^2 - 4%0%2)) / (2%0)". Call the result with a row of data
+# for its answer, or use evaluate_rows for many rows at once
+def compile_answer(text):
+  return compile_expression(text, variables='', data=True)
+
+# The answers to a problem as compiled answer keys, one per answer. Called
+# with a row of data it gives the answer list, so it can be put straight
+# in p.answer and worked out only when the problem is first checked
+class AnswerKey:
+  def __init__(self, keys):
+    self.keys = [compile_answer(key) if isinstance(key, basestring) else key
+                 for key in keys]
+
+  def __repr__(self):
+    return 'AnswerKey(%r)' % [str(key) for key in self.keys]
+
+  def __call__(self, data):
+    return [key(data) for key in self.keys]
+
+  # The answer lists for many rows of data, worked out a column at a time
+  # with numpy. Answers that are undefined for a row come out as nan
+  def evaluate_rows(self, rows):
+    rows = numpy.asarray(rows, dtype=complex)
+    columns = [key.evaluate_rows(rows).tolist() for key in self.keys]
+    return [[to_number(value) for value in answer] for answer in zip(*columns)]
+
+# Converts a value to a float if it has no imaginary part, the way
+# interpret returns numbers
+def to_number(value):
+  if value.imag == 0:
+    return value.real
+  return value
+
+# Reads an expression in one pass with the same shunting-yard approach as
+# AnswerInterpreter.evaluate, but writes out a postfix program instead of
+# computing a value
+def parse(text, variables, data):
+  program = []
+  ops = []       # Pending operators, '(' and 'neg' for unary minus
+  positions = [] # Where each pending operator was found
+  expect_operand = True
+  after_operand = False # A number here is multiplied by what came before
+  n = len(text)
+  i = 0
+  while True:
+    i = skip_spaces(text, i)
+    if i >= n:
+      break
+    c = text[i]
+
+    if c in '0123456789.':
+      end = NUMBER_PATTERN.match(text, i).end()
+      value = parse_number(text[i:end], i)
+      if not expect_operand:
+        if not after_operand:
+          raise InvalidTokenError('Two numbers in a row', i, text[i:end])
+        push_operator('*', i, program, ops, positions)
+      program.append(('const', complex(value)))
+      i = end
+      expect_operand = after_operand = False
+
+    elif c.isalpha():
+      name = NAME_PATTERN.match(text, i).group()
+      if not expect_operand:
+        push_operator('*', i, program, ops, positions)
+      if name in FUNCTIONS:
+        # Applied once the parentheses after it are closed
+        ops.append(name)
+        positions.append(i)
+        i += len(name)
+        expect_operand = True
+        continue
+      if name in CONSTANTS:
+        program.append(('const', CONSTANTS[name]))
+      elif c in 'ij':
+        program.append(('const', 1j))
+      elif variables is not None and c not in variables:
+        raise InvalidTokenError('Unknown variable', i, c)
+      else:
+        program.append(('var', c))
+      i += len(name)
+      expect_operand = False
+      after_operand = True
+
+    elif c == '%' and data:
+      match = DATA_PATTERN.match(text, i)
+      if match is None:
+        raise InvalidTokenError('Parse error', i, c)
+      if not expect_operand:
+        push_operator('*', i, program, ops, positions)
+      program.append(('data', int(match.group(1))))
+      i = match.end()
+      expect_operand = False
+      after_operand = True
+
+    elif c in '+-*/^':
+      if expect_operand:
+        if c in '*/^':
+          raise UnexpectedTokenError('Parse error', i, c)
+        if c == '-':
+          ops.append('neg')
+          positions.append(i)
+      else:
+        push_operator(c, i, program, ops, positions)
+        expect_operand = True
+      i += 1
+
+    elif c == '(':
+      if not expect_operand:
+        push_operator('*', i, program, ops, positions)
+      ops.append('(')
+      positions.append(i)
+      expect_operand = True
+      i += 1
+
+    elif c == ')':
+      if expect_operand:
+        raise UnexpectedTokenError('Parse error', i, c)
+      while ops and ops[-1] != '(':
+        emit(ops.pop(), positions.pop(), program)
+      if not ops:
+        raise UnexpectedTokenError('Parse error', i, c)
+      ops.pop()
+      positions.pop()
+      after_operand = True
+      i += 1
+
+    else:
+      raise InvalidTokenError('Parse error', i, c)
+
+  if expect_operand:
+    if not program and not ops:
+      raise UnexpectedTokenError('Nothing to interpret', 0)
+    raise UnexpectedTokenError('Stray operator found at end of symbol')
+  while ops:
+    if ops[-1] == '(':
+      raise UnbalancedParenthesesError('Unmatched parenthesis', positions[-1], '(')
+    emit(ops.pop(), positions.pop(), program)
+  return program
+
+# Pushes a binary operator, first writing out any pending operators that
+# bind at least as tightly, or more tightly for right associative ones
+def push_operator(op, position, program, ops, positions):
+  precedence = PRECEDENCE[op]
+  if op in RIGHT_ASSOCIATIVE:
+    precedence += 1
+  while (ops and ops[-1] != '(' and
+         PRECEDENCE.get(ops[-1], FUNCTION_PRECEDENCE) >= precedence):
+    emit(ops.pop(), positions.pop(), program)
+  ops.append(op)
+  positions.append(position)
+
+# Writes an operator to the program. Operators on constants are worked out
+# here, so they cost nothing when the expression is evaluated
+def emit(op, position, program):
+  if op in FUNCTIONS:
+    if program[-1][0] == 'const':
+      try:
+        program[-1] = ('const', complex(FUNCTIONS[op](program[-1][1])))
+        return
+      except UNDEFINED:
+        pass # Left for evaluation, which gives nan instead
+    program.append(('call', op))
+    return
+  if op == 'neg':
+    if program[-1][0] == 'const':
+      program[-1] = ('const', -program[-1][1])
+    else:
+      program.append(('neg', None))
+    return
+  if program[-1][0] == 'const' and program[-2][0] == 'const':
+    try:
+      value = BINARY[op](program[-2][1], program[-1][1])
+    except ZeroDivisionError:
+      raise DivideByZeroError('Divide by zero error', position, op)
+    except OverflowError:
+      value = None # Left for evaluation, which gives inf instead
+    if value is not None:
+      program[-2:] = [('const', value)]
+      return
+  program.append((op, None))
+
+
+
+# Tests if a guess is the same expression as the answer key, by comparing
+# their values at random points. The guess may be a string, an Expression
+# or a number. Values must agree within a relative tolerance at every
+# point where the key is defined.
+# Return: True or False. A guess that can't be compiled is False
+def equivalent(guess, key, tolerance, count=SAMPLE_COUNT):
+  if isinstance(guess, basestring):
+    try:
+      guess = compile_expression(guess)
+    except ParseError:
+      return False
+  elif type(guess) in (int, long, float, complex):
+    guess = Expression(str(guess), [('const', complex(guess))], ())
+  elif not isinstance(guess, Expression):
+    return False
+  names = tuple(sorted(set(key.variables) | set(guess.variables)))
+  expected = key.sample(names, count)
+  actual = guess.sample(names, count)
+
+  if numpy is not None:
+    with numpy.errstate(all='ignore'):
+      defined = numpy.isfinite(expected)
+      error = numpy.abs(actual - expected)
+      close = error <= numpy.maximum(tolerance * numpy.abs(expected), ABSOLUTE_TOLERANCE)
+    return bool(defined.any() and close[defined].all())
+  defined = False
+  for a, e in zip(actual, expected):
+    if e != e or abs(e) == float('inf'):
+      continue
+    defined = True
+    if not abs(a - e) <= max(tolerance * abs(e), ABSOLUTE_TOLERANCE):
+      return False
+  return defined
@@ -31,104 +31,395 @@ SOFTWARE.
 
 
 import re
-
-class Term:
-  desc = ""
-  negative = False
-  imaginary = False
-  inverse = False
-  val = None
+import copy
+import threading
+from collections import OrderedDict
+
+# numpy is only needed for interpreting answers in bulk
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# How tightly each operator binds. Unary minus binds tightest
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2, 'neg': 3}
+
+# Digits with at most one decimal point, such as 4, 4.5, .5 or 4.
+NUMBER_PATTERN = re.compile(r'[0-9]*\.?[0-9]*')
+
+# Strings made only of the characters predict_number and predict_complex
+# allow
+NUMBER_CHARACTERS = re.compile(r'[0-9.+\-*/() ]*\Z')
+COMPLEX_CHARACTERS = re.compile(r'[0-9.+\-*/()ij]*\Z')
+
+# Plain numbers like -4.5, and complex numbers like 1+j or 0.5-0.866j, that
+# float() and complex() read the same way interpret does
+REAL_LITERAL = re.compile(r' *-?(?:[0-9]+\.?[0-9]*|\.[0-9]+) *$')
+COMPLEX_LITERAL = re.compile(r' *-?(?:(?:[0-9]+\.?[0-9]*|\.[0-9]+)[+-])?'
+                             r'(?:[0-9]+\.?[0-9]*|\.[0-9]+)?j *$')
+
+# Raised when a string looks like a number but can't be interpreted.
+# Records where in the string things went wrong and the offending token
+class ParseError(Exception):
+  def __init__(self, msg, position=None, token=None):
+    Exception.__init__(self, msg)
+    self.msg = msg
+    self.position = position
+    self.token = token
+    self.query = None # Filled in by interpret
 
   def __str__(self):
-    s = ''
-    if self.negative: s += "-"
-    if self.inverse: s += "1/"
-    if self.val != None:
-      if self.imaginary: s += "j"
-      return s+str(self.val)
-    else:
-      return s+str(self.desc)
-
-def error(msg):
-  print msg
-  exit()
+    s = '>> ' + self.msg
+    if self.token is not None:
+      s += " at token '" + str(self.token) + "'"
+    if self.position is not None:
+      s += ' (position ' + str(self.position) + ')'
+    if self.query is not None:
+      s += ' for symbol ' + self.query
+    return s
+
+# A character or number that doesn't belong where it was found
+class InvalidTokenError(ParseError):
+  pass
+
+# An operator or parenthesis in the wrong place, or a missing operand
+class UnexpectedTokenError(ParseError):
+  pass
+
+# A '(' that is never closed
+class UnbalancedParenthesesError(ParseError):
+  pass
+
+class DivideByZeroError(ParseError):
+  pass
+
+# Bounded memo of interpreted strings, evicting the least recently used
+# entry when full. Safe to share between threads. Keys are the exact strings,
+# since a string that isn't a number is returned as it is. Strings that
+# can't be parsed are remembered too, and raise a copy of the same error
+class ParseCache:
+  def __init__(self, maxsize=4096):
+    self.maxsize = maxsize
+    self.entries = OrderedDict()
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  # Interprets a string, reusing the earlier result if it has been seen
+  def interpret(self, query):
+    with self.lock:
+      entry = self.entries.pop(query, None)
+      if entry is not None:
+        self.entries[query] = entry # Now the most recently used
+        self.hits += 1
+      else:
+        self.misses += 1
+    if entry is None:
+      try:
+        entry = (interpret_string(query), None)
+      except ParseError, e:
+        entry = (None, e)
+      with self.lock:
+        if query not in self.entries:
+          self.entries[query] = entry
+          if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    value, error = entry
+    if error is not None:
+      raise copy.copy(error)
+    return value
+
+  def stats(self):
+    with self.lock:
+      return {'hits': self.hits, 'misses': self.misses,
+              'evictions': self.evictions, 'size': len(self.entries),
+              'maxsize': self.maxsize}
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+      self.hits = self.misses = self.evictions = 0
+
+# The cache used by interpret. None unless enable_parse_cache is called
+parse_cache = None
+
+# Makes interpret remember up to maxsize strings. Returns the cache so its
+# statistics can be read
+def enable_parse_cache(maxsize=4096):
+  global parse_cache
+  parse_cache = ParseCache(maxsize)
+  return parse_cache
+
+def disable_parse_cache():
+  global parse_cache
+  parse_cache = None
 
 def interpret(query):
   if type(query) is not str:
     return query
+  if parse_cache is not None:
+    return parse_cache.interpret(query)
+  return interpret_string(query)
 
+# Interprets a string without consulting the cache
+def interpret_string(query):
   # Converts string number to numerical type
   if (predict_number(query) or predict_complex(query)):
-    # Double negatives mean plus
-    query = query.replace('--','+')
-    query = fix_minuses(query)
-    query = fix_imaginaries(query)
-    # Double characters are problematic
-    violation = re.findall(r'([\+\*/])([\+\*/])+', query)
-    if len(violation):
-      error(">> Parse error: multiple consecutive operators")
-    if query[0] in '\+\*/' or query[-1] in '\+-\*/':
-      error(">> Stray operator found in symbol"+ query)
-
-    return term_to_value(evaluate_string__no_parens(query))
+    try:
+      value = evaluate(query)
+    except ParseError, e:
+      e.query = query
+      if e.position is None:
+        e.position = len(query)
+      raise
+    return pair_to_value(value)
 
   return query
 
-# Reduces a string to a real term and an imaginary term. Returns them in
-# a list with the real part first. String must not contain parenthesis
-def evaluate_string__no_parens(query):
-  all_addends = []
-  # Handles addition and subtraction
-  for term in aunt_sally(query):
-    term_m = my_dear(term.desc)
-    post_multiply = get_product(term_m)
-    if term.negative:
-      post_multiply.negative = not post_multiply.negative
-    
-    # Combine multiplicative terms
-    all_addends.append(post_multiply)
-
-  zero = Term()
-  zero.val = 0
-  # Group real and imaginary
-  real = [t for t in all_addends if not t.imaginary]
-  imag = [t for t in all_addends if t.imaginary]
-  # Combine additive terms
-  real_part = get_sum(real) if len(real) else zero
-  imag_part = get_sum(imag) if len(imag) else zero
-  
-  return [real_part, imag_part]
-
-
-
-# Converts a term or list of terms to a numerical value
-def term_to_value(terms):
-  zero = Term()
-  zero.val = 0
-  # Group real and imaginary
-  real = [t for t in terms if not t.imaginary]
-  imag = [t for t in terms if t.imaginary]
-  # Combine multiplicative terms
-  real_part = get_sum(real) if len(real) else zero
-  imag_part = get_sum(imag) if len(imag) else zero
-
-  if type(terms) is not list:
-    terms = [terms]
-  # Returns in a number format
-  if imag_part.val == 0:
-    return real_part.val if not real_part.negative else -real_part.val
+# Interprets many strings without stopping at the first bad one. Values
+# are yielded one at a time, in order. A string that can't be parsed
+# yields default instead, and (index, ParseError) is appended to failures
+# if a list is given
+def interpret_many(queries, failures=None, default=None):
+  for index, query in enumerate(queries):
+    try:
+      yield interpret(query)
+    except ParseError, e:
+      if failures is not None:
+        failures.append((index, e))
+      yield default
+
+
+# Interprets a column of answers straight into a numpy array, so grading
+# can work on arrays from start to finish. dtype is complex or float. Plain
+# numbers skip the parser entirely. Anything that isn't a number, or is
+# complex when dtype is float, is left as nan and marked invalid.
+# Return: The values and a boolean array saying which ones are valid
+def interpret_array(queries, dtype=complex):
+  if numpy is None:
+    print 'interpret_array requires numpy.'
+    return -1
+  nan = float('nan')
+  real_only = numpy.dtype(dtype).kind == 'f'
+  values = []
+  valid = []
+  for query in queries:
+    if type(query) is str:
+      if REAL_LITERAL.match(query):
+        values.append(float(query))
+        valid.append(True)
+        continue
+      if not real_only and COMPLEX_LITERAL.match(query):
+        values.append(complex(query))
+        valid.append(True)
+        continue
+      try:
+        value = interpret(query)
+      except ParseError:
+        value = None
+    else:
+      value = query
+    if type(value) in (int, long, float) or (type(value) is complex and not real_only):
+      values.append(value)
+      valid.append(True)
+    else:
+      values.append(nan)
+      valid.append(False)
+  return numpy.array(values, dtype=dtype), numpy.array(valid, dtype=bool)
+
+
+
+# Evaluates a string in a single pass, reading each token and reducing 
+# operators as soon as their precedence allows. Values waiting for an 
+# operator sit on one stack and operators waiting for an operand on 
+# another, so no tokens or syntax tree are built. Real values are plain 
+# ints and floats, and anything imaginary is a (real, imaginary) pair. 
+# A number written next to an imaginary unit or a parenthesis is 
+# multiplied by it, so 4j reads as 4*j
+def evaluate(query):
+  values = []
+  ops = []       # Pending operators, '(' and 'neg' for unary minus
+  positions = [] # Where each pending operator was found
+  expect_operand = True
+  after_close = False
+  n = len(query)
+  i = 0
+  while True:
+    while i < n and query[i] == ' ':
+      i += 1
+    if i >= n:
+      break
+    c = query[i]
+
+    if c in '0123456789.':
+      end = NUMBER_PATTERN.match(query, i).end()
+      text = query[i:end]
+      value = parse_number(text, i)
+      imaginary = False
+      # 4.j is a single imaginary number, 4j is 4*j
+      if text[-1] == '.':
+        k = skip_spaces(query, end)
+        if k < n and query[k] in 'ij':
+          imaginary = True
+          end = k + 1
+      if not expect_operand:
+        if not (imaginary or after_close):
+          raise InvalidTokenError('Two numbers in a row', i, text)
+        push_operator('*', i, values, ops, positions)
+      values.append((0, value) if imaginary else value)
+      i = end
+      expect_operand = after_close = False
+
+    elif c in 'ij':
+      if not expect_operand:
+        push_operator('*', i, values, ops, positions)
+      value = 1
+      # j4 is the imaginary number 4j
+      end = i + 1
+      while end < n and query[end] == ' ':
+        end += 1
+      if end < n and query[end] in '0123456789.':
+        k = NUMBER_PATTERN.match(query, end).end()
+        value = parse_number(query[end:k], end)
+        i = k
+      else:
+        i = i + 1
+      values.append((0, value))
+      expect_operand = after_close = False
+
+    elif c in '+-*/':
+      if expect_operand:
+        if c in '*/':
+          raise UnexpectedTokenError('Parse error', i, c)
+        if c == '-':
+          ops.append('neg')
+          positions.append(i)
+      else:
+        push_operator(c, i, values, ops, positions)
+        expect_operand = True
+      i += 1
+
+    elif c == '(':
+      if not expect_operand:
+        push_operator('*', i, values, ops, positions)
+      ops.append('(')
+      positions.append(i)
+      expect_operand = True
+      i += 1
+
+    elif c == ')':
+      if expect_operand:
+        raise UnexpectedTokenError('Parse error', i, c)
+      while ops and ops[-1] != '(':
+        reduce_operator(values, ops, positions)
+      if not ops:
+        raise UnexpectedTokenError('Parse error', i, c)
+      ops.pop()
+      positions.pop()
+      after_close = True
+      i += 1
+
+    else:
+      raise InvalidTokenError('Parse error', i, c)
+
+  if expect_operand:
+    if not values and not ops:
+      raise UnexpectedTokenError('Nothing to interpret', 0)
+    raise UnexpectedTokenError('Stray operator found at end of symbol')
+  while ops:
+    if ops[-1] == '(':
+      raise UnbalancedParenthesesError('Unmatched parenthesis', positions[-1], '(')
+    reduce_operator(values, ops, positions)
+  return values[0]
+
+# Pushes a binary operator, first reducing any pending operators that bind
+# at least as tightly
+def push_operator(op, position, values, ops, positions):
+  precedence = PRECEDENCE[op]
+  while ops and ops[-1] != '(' and PRECEDENCE[ops[-1]] >= precedence:
+    reduce_operator(values, ops, positions)
+  ops.append(op)
+  positions.append(position)
+
+# Applies the operator on top of the stack to the values it needs
+def reduce_operator(values, ops, positions):
+  op = ops.pop()
+  position = positions.pop()
+  if op == 'neg':
+    operand = values.pop()
+    if type(operand) is tuple:
+      values.append((-operand[0], -operand[1]))
+    else:
+      values.append(-operand)
   else:
-    return complex(real_part.val if not real_part.negative else -real_part.val,
-      imag_part.val if not imag_part.negative else -imag_part.val)
+    rhs = values.pop()
+    values[-1] = apply_operator(op, values[-1], rhs, position)
+
+# Returns the index of the next character that is not a space
+def skip_spaces(query, i):
+  while i < len(query) and query[i] == ' ':
+    i += 1
+  return i
+
+# Converts the text of a number to an int or a float
+def parse_number(text, position):
+  if text == '.':
+    raise InvalidTokenError('Parse error', position, text)
+  if '.' in text:
+    return float(text)
+  return int(text)
+
+
+
+# Combines two values with a binary operator. Purely real arithmetic stays
+# in integers until something is divided. position is where the operator
+# was found, for error reporting
+def apply_operator(op, lhs, rhs, position=None):
+  if type(lhs) is not tuple and type(rhs) is not tuple:
+    if op == '+':
+      return lhs + rhs
+    if op == '-':
+      return lhs - rhs
+    if op == '*':
+      return lhs * rhs
+    if rhs == 0:
+      raise DivideByZeroError('Divide by zero error', position, op)
+    return lhs / float(rhs)
+
+  a, b = lhs if type(lhs) is tuple else (lhs, 0)
+  c, d = rhs if type(rhs) is tuple else (rhs, 0)
+  if op == '+':
+    return (a + c, b + d)
+  if op == '-':
+    return (a - c, b - d)
+  if op == '*':
+    return (a*c - b*d, a*d + b*c)
+  # Division
+  if d == 0:
+    if c == 0:
+      raise DivideByZeroError('Divide by zero error', position, op)
+    return (a / float(c), b / float(c))
+  scale = float(c*c + d*d)
+  return ((a*c + b*d) / scale, (b*c - a*d) / scale)
+
+# Converts a parsed value to a number. Values with no imaginary part come
+# back as plain ints or floats
+def pair_to_value(value):
+  if type(value) is not tuple:
+    return value
+  if value[1] == 0:
+    return value[0]
+  return complex(value[0], value[1])
+
+
 
 # Tries to tell if the entered string should be parsed to a number or not
 def predict_number(query):
-  # There is a stray letter or two. Not a number
-  if any(letter in 'abcdefghijklmnopqrstuvwxyz' for letter in query): 
-    return False# All numbers are digits, simple operations, or imaginary coefficients
-  if all(letter in '0123456789.+-*/' for letter in query): 
-    return True
-  return False
+  # All numbers are digits, simple operations or parentheses. Any stray 
+  # letter means it's not a number
+  return NUMBER_CHARACTERS.match(query) is not None
 
 
 
@@ -143,209 +434,6 @@ def predict_complex(query):
   # it's silly and isn't a good complex number
   if contains_i == contains_j or strange_looking:
     return False
-  # There is a stray letter or two. Not complex.
-  if any(letter in 'abcdefghklmnopqrstuvwxyz' for letter in query): 
-    return False
-  # All numbers are digits, simple operations, or imaginary coefficients
-  if all(letter in '0123456789.+-*/ij' for letter in query): 
-    return True
-
-
-
-
-# A parser that only looks for the addition and subtraction operations
-# returns a list of Term objects whose only valid fields are the 
-# description and whether it is positive or negative. This ignores 
-# parenthesis
-def aunt_sally(query):
-  query = query.strip() #lose the spaces
-  terms = []
-  # Addition Layer
-  addends = [i for i in query.split('+') if i != '']
-  for addend in addends:
-    addend = addend.strip() #lose the spaces
-    
-    # Subtraction Layer
-    t = Term()
-    if addend.count('-')%2 == 1:
-      t.negative = True 
-    addend = addend.replace('-','')
-    t.desc = addend.strip()
-    terms.append(t)
-  return terms
-
-
-
-# A parser that only looks for the multiplication and divison operations
-# returns a list of Term objects whose only valid fields are the 
-# description and whether it is positive or negative. This ignores 
-# parenthesis
-def my_dear(query):
-  query = query.strip() #lose the spaces
-  terms = []
-  #Multiplication Layer
-  multiplicands = query.split('*')
-  if query[0] == '*' or query[-1] == '*':
-    error(">> Parse Error at token '*' for symbol "+ query)
-  for multiplicand in multiplicands:
-    multiplicand.strip() #lose the spaces
-    #Division Layer
-    dividends = multiplicand.split('/')
-    # Out of place divide symbol
-    if multiplicand[0] == '/' or multiplicand[-1] == '/':
-      error(">> Parse Error at token '/' for symbol "+ multiplicand)
-    #The first term is not an inverse
-    t = parse_token(dividends[0])
-    terms.append(t)
-    #The rest of the terms are inverses
-    for dividend in dividends[1:]:
-      t = parse_token(dividend)
-      t.inverse = True
-      if (t!=-1):
-        terms.append(t)
-  return terms
-
-
-
-
-# Pareses a single token, which no longer contains any operators,
-# only digits, decimals, and imaginary terms
-def parse_token(query):
-  query = query.strip()
-  # All numbers are digits, simple operations, or imaginary coefficients
-  if not all(letter in '0123456789.ij ' for letter in query): 
-    error(">> Parse error for symbol "+ query)
-  if query.count('.') > 1:
-    error(">> Parse error at token '.' for symbol "+ query)
-  contains_i = 'i' in query 
-  contains_j = 'j' in query
-  
-  # Multiple complex coefficients in a row
-  if 'ii' in query or 'jj' in query:
-    error(">> Repeated complex coefficients disallowed for symbol "+ query)
-  t = Term()
-  t.desc = query
-  
-  # If it is a complex number
-  if contains_i or contains_j:
-    complex_term = 'i' if 'i' in query else 'j'
-    # Spaces near complex terms can be removed
-    query = complex_term.join([i.strip() for i in query.split(complex_term)])
-    # The query is just 'i' or 'j'
-    if query == complex_term: 
-      t.val = 1
-      t.imaginary = True
-      return t
-    if query[0] != complex_term and query[-1] != complex_term:
-      if contains_i: error(">> Parse error at token 'i' "+ query)
-      elif contains_j: error(">> Parse error at token 'j' "+ query)
-    
-    query = query.replace(complex_term,'')
-    t.imaginary = True
-  
-  if ' ' in query:
-    error(">> Unexpected whitespace for symbol "+ query)
-  
-  # Handle numerical info
-  if '.' in query:
-    t.val = float(query)
-  else:
-    t.val = int(query)
-  return t
-  
-
-
-# Multiplies a list of terms together and returns a product term.
-# Assumes signs are already stripped from terms and put in 'negative'
-# field with their val fields assigned
-def get_product(terms):
-  if type(terms) is not list:
-    error(">> Error in get_product: Expected list")
-  if len(terms)== 1:
-    return terms[0] 
-  result = Term()
-  result.val = 1;
-  for term in terms:
-    if term.val == None:
-        error(">> Val not set in token "+ term.desc)
-    # Division
-    if term.inverse:
-      if term.val == 0:
-        error(">> Divide by zero error")
-      #1/i = -i, no integer division
-      if term.imaginary!=term.negative: 
-        result.negative = not result.negative 
-      result.val *= 1 / (1.0*term.val)
-    # Multiplication
-    else:
-      if term.negative:
-        result.negative = not result.negative
-      result.val *= 1 * term.val
-    # i * i = -1
-    if term.imaginary and result.imaginary:
-      result.negative = not result.negative
-    result.imaginary = term.imaginary != result.imaginary
-
-  return result
-
-
-
-# Combines several terms into one additively. Terms must either
-# all be imaginary or all real
-def get_sum(terms):
-  sum_term = Term()
-  if all(t.imaginary for t in terms):
-    sum_term.imaginary = True
-  elif all(not t.imaginary for t in terms):
-    sum_term.imaginary = False
-  else:
-    error(">> get_sum cannot add real and imaginary components")
-  sum_term.val = 0
-
-  for t in terms:
-    if t.negative:
-      sum_term.val -= t.val
-    else: 
-      sum_term.val += t.val
-  if sum_term.val < 0:
-    sum_term.val = abs(sum_term.val)
-    sum_term.negative = True
-  return sum_term
-
-
-
-# It is easier to parse a string where all the minuses are unary than
-# one where binary and unary minuses are mixed. For that reason, we make
-# them all unary
-def fix_minuses(query):
-  # Remove spaces surrounding operators
-  query = "+".join([seg.strip() for seg in query.split("+")])
-  query = "-".join([seg.strip() for seg in query.split("-")])
-  query = "*".join([seg.strip() for seg in query.split("*")])
-  query = "/".join([seg.strip() for seg in query.split("/")])
-  i=1
-  # Add plusses in front of minus signs to correct any unary minuses
-  while i < len(query):
-    if query[i] == '-':
-      if query[i-1] not in '+*/':
-        query = query[:i]+'+'+query[i:]
-        i=i-1
-    i=i+1    
-
-  return query
-
-# Replaces 4j with 4*j. Just makes things explicit for order of operations later
-def fix_imaginaries(query):
-  query = "i".join([seg.strip() for seg in query.split("i")])
-  query = "j".join([seg.strip() for seg in query.split("j")])
-  i = 1
-  while i < len(query):
-    if query[i] == 'i' or query[i] == 'j':
-      if query[i-1] in '0123456789':
-        query = query[:i]+'*'+query[i:]
-        i=i-1
-    i=i+1    
-  return query
-
-
- 
\ No newline at end of file
+  # All numbers are digits, simple operations, or imaginary coefficients.
+  # Any other letter means it's not complex
+  return COMPLEX_CHARACTERS.match(query) is not None
@@ -0,0 +1,252 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Matches a set of guesses to a set of answers when order does not matter
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import math
+
+from bisect import bisect_left, bisect_right
+
+# Types that may have a mathematical tolerance, as in test_single_answer
+NUMERIC_TYPES = (int, float, complex)
+
+# Tests if guesses and answers can be paired up one to one, so that every
+# guess passes test(guess, answer) for its partner. Neither list is copied
+# or modified. Numerical answers are sorted along one axis, so each guess
+# is only tested against the few answers that fall within its tolerance.
+# Return: True if a complete pairing exists
+def match_unordered(guess, answer, test, tolerance):
+  if len(guess) != len(answer):
+    return False
+  candidates = find_candidates(guess, answer, test, tolerance)
+  return has_perfect_matching(candidates)
+
+
+
+# For each guess, lists the indices of the answers that it passes
+def find_candidates(guess, answer, test, tolerance):
+  numeric = [i for i in range(len(answer)) if type(answer[i]) in NUMERIC_TYPES]
+  other = [i for i in range(len(answer)) if type(answer[i]) not in NUMERIC_TYPES]
+  # Strings can only equal strings, so they are looked up by value
+  strings = {}
+  for i in other:
+    if isinstance(answer[i], basestring):
+      strings.setdefault(answer[i], []).append(i)
+  not_strings = [i for i in other if not isinstance(answer[i], basestring)]
+
+  # Windows can't be computed for huge tolerances. Test everything
+  if tolerance >= 1:
+    return [[i for i in range(len(answer)) if test(g, answer[i])] for g in guess]
+
+  # Sort along whichever axis separates the answers best
+  reals = [answer[i].real for i in numeric]
+  imags = [answer[i].imag if type(answer[i]) is complex else 0 for i in numeric]
+  use_real = len(set(reals)) >= len(set(imags))
+  keys = reals if use_real else imags
+  order = sorted(range(len(numeric)), key=keys.__getitem__)
+  sorted_keys = [keys[i] for i in order]
+  sorted_index = [numeric[i] for i in order]
+
+  candidates = []
+  for g in guess:
+    if type(g) in NUMERIC_TYPES:
+      if use_real:
+        low, high = tolerance_window(g.real, tolerance)
+      elif type(g) is complex:
+        low, high = tolerance_window(g.imag, tolerance)
+      else:
+        # Real guesses only match answers with a negligible imaginary part
+        low, high = -tolerance, tolerance
+      start = bisect_left(sorted_keys, low)
+      stop = bisect_right(sorted_keys, high)
+      possible = sorted_index[start:stop] + other
+    elif isinstance(g, basestring):
+      possible = strings.get(g, []) + not_strings
+    else:
+      possible = range(len(answer))
+    candidates.append([i for i in possible if test(g, answer[i])])
+  return candidates
+
+
+
+# Sets of fewer numbers than this are quicker to test one by one
+SMALL_SET = 6
+
+# Any one of many answers accepted for a single slot, such as every root
+# in a long list or several ways of writing the same word. Put one in
+# p.answer in place of a single value. Strings are looked up by value, and
+# numbers are bucketed by the logarithm of their real and imaginary parts
+# so a guess is only tested against the few answers near it. With a period,
+# real answers and guesses are reduced modulo it first, so
+# AnswerSet([30], period=360) accepts any angle coterminal with 30 degrees.
+class AnswerSet:
+  def __init__(self, answers, period=None):
+    self.answers = list(answers)
+    self.period = period
+    self.numbers = [] # Tested through an index, built for each tolerance
+    self.strings = set()
+    self.others = []  # Anything else is tested one by one
+    for a in self.answers:
+      if type(a) in NUMERIC_TYPES:
+        if period is not None and type(a) is not complex:
+          a = a % period
+        self.numbers.append(a)
+      elif isinstance(a, basestring):
+        self.strings.add(a)
+      else:
+        self.others.append(a)
+    self.indexes = {} # Buckets of numbers by tolerance
+
+  def __len__(self):
+    return len(self.answers)
+
+  def __iter__(self):
+    return iter(self.answers)
+
+  def __repr__(self):
+    return 'AnswerSet(%r)' % self.answers
+
+  # Tests if guess passes test(guess, answer) for any accepted answer
+  def accepts(self, guess, test, tolerance):
+    if type(guess) in NUMERIC_TYPES:
+      if self.period is not None and type(guess) is not complex:
+        guess = guess % self.period
+      for a in self.nearby(guess, tolerance):
+        if test(guess, a):
+          return True
+    elif isinstance(guess, basestring):
+      if guess in self.strings:
+        return True
+    for a in self.others:
+      if test(guess, a):
+        return True
+    return False
+
+  # The numbers that a guess could be within tolerance of
+  def nearby(self, guess, tolerance):
+    if (len(self.numbers) < SMALL_SET or not (0 < tolerance < 1)
+        or not is_finite(guess)):
+      return self.numbers
+    index = self.indexes.get(tolerance)
+    if index is None:
+      index = self.indexes[tolerance] = self.build_index(tolerance)
+    grid, near_real, width = index
+    found = []
+    if type(guess) is complex:
+      for real in neighbours(guess.real, width):
+        for imag in neighbours(guess.imag, width):
+          found.extend(grid.get((real, imag), ()))
+    else:
+      for real in neighbours(guess, width):
+        found.extend(near_real.get(real, ()))
+    return found
+
+  # Buckets wide enough that a guess within tolerance of an answer is in
+  # the answer's bucket or one next to it. Complex guesses look in a grid
+  # of real and imaginary buckets. Real guesses only match answers whose
+  # imaginary part is below the tolerance, which get an index of their own
+  def build_index(self, tolerance):
+    width = -math.log(1 - tolerance) * 1.01
+    grid = {}
+    near_real = {}
+    for a in self.numbers:
+      real = bucket(a.real, width)
+      grid.setdefault((real, bucket(a.imag, width)), []).append(a)
+      if type(a) is not complex or abs(a.imag) < tolerance:
+        near_real.setdefault(real, []).append(a)
+    return grid, near_real, width
+
+# The bucket a real number falls in, as (sign, log bucket). Zero only
+# matches zero, so it gets a bucket to itself
+def bucket(x, width):
+  if x == 0:
+    return (0, 0)
+  return (1 if x > 0 else -1, int(math.floor(math.log(abs(x)) / width)))
+
+# The buckets holding the numbers that x could be within tolerance of
+def neighbours(x, width):
+  sign, n = bucket(x, width)
+  if sign == 0:
+    return [(0, 0)]
+  return [(sign, n - 1), (sign, n), (sign, n + 1)]
+
+def is_finite(x):
+  return not (math.isinf(x.real) or math.isnan(x.real) or
+              math.isinf(x.imag) or math.isnan(x.imag))
+
+
+
+# Gives the range of answers that a number can be within a relative
+# tolerance of. Zero only matches zero
+def tolerance_window(x, tolerance):
+  if x == 0:
+    return 0, 0
+  low = x / (1.0 + tolerance)
+  high = x / (1.0 - tolerance)
+  return min(low, high), max(low, high)
+
+
+
+# Tests if each guess can be paired with a distinct answer. candidates[i]
+# lists the answers that guess i may be paired with. Uses augmenting paths,
+# searched without recursion so long chains can't overflow the stack
+def has_perfect_matching(candidates):
+  owner = {} # owner[j] is the guess currently paired with answer j
+  for start in range(len(candidates)):
+    # Easy case: an unclaimed answer is free to take
+    free = [j for j in candidates[start] if j not in owner]
+    if free:
+      owner[free[0]] = start
+      continue
+    # Otherwise search for a chain of guesses that can each move over
+    came_from = {} # answer -> (previous answer, guess that wants it)
+    frontier = [(j, None, start) for j in candidates[start]]
+    found = None
+    while frontier and found is None:
+      next_frontier = []
+      for j, prev, row in frontier:
+        if j in came_from:
+          continue
+        came_from[j] = (prev, row)
+        if j not in owner:
+          found = j
+          break
+        for k in candidates[owner[j]]:
+          if k not in came_from:
+            next_frontier.append((k, j, owner[j]))
+      frontier = next_frontier
+    if found is None:
+      return False
+    # Shift every guess on the chain over to its new answer
+    j = found
+    while j is not None:
+      prev, row = came_from[j]
+      owner[j] = row
+      j = prev
+  return True
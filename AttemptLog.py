@@ -0,0 +1,190 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+A local, append-only record of every graded attempt
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import json
+import time
+import sqlite3
+from timeit import default_timer
+import AnswerInterpreter
+from AnswerInterpreter import ParseError
+
+# Attempts are only ever added. Totals for each problem and each student
+# are kept up to date as attempts are written, so rates come from a single
+# row instead of a scan, and the indexes serve a student's history or a
+# problem's attempts in order without touching anything else.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS attempts (
+  id INTEGER PRIMARY KEY, time REAL, student TEXT, problem TEXT,
+  raw TEXT, parsed TEXT, correct INTEGER, latency REAL);
+CREATE INDEX IF NOT EXISTS attempts_by_problem ON attempts (problem, id);
+CREATE INDEX IF NOT EXISTS attempts_by_student ON attempts (student, id);
+CREATE TABLE IF NOT EXISTS problem_totals (
+  problem TEXT PRIMARY KEY, attempts INTEGER, correct INTEGER,
+  invalid INTEGER, latency REAL);
+CREATE TABLE IF NOT EXISTS student_totals (
+  student TEXT PRIMARY KEY, attempts INTEGER, correct INTEGER,
+  invalid INTEGER, latency REAL);
+'''
+
+COLUMNS = ['id', 'time', 'student', 'problem', 'raw', 'parsed', 'correct', 'latency']
+
+# An attempt log stored in an SQLite file. Attempts are buffered and
+# written batch_size at a time in one transaction, or sooner once the
+# oldest has waited flush_interval seconds, or when the log is flushed,
+# queried or closed. correct is 1 or 0, or -1 if the attempt couldn't be
+# graded
+class AttemptLog:
+  def __init__(self, path, batch_size=1000, flush_interval=1.0):
+    self.path = path
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval
+    self.pending = []
+    self.db = sqlite3.connect(path)
+    self.db.text_factory = str
+    self.db.execute('PRAGMA journal_mode=WAL')
+    self.db.execute('PRAGMA synchronous=NORMAL')
+    self.db.executescript(SCHEMA)
+
+  # Adds one attempt. raw is what the student typed, a string or a list of
+  # them, and parsed is what it was read as, if anything
+  def record(self, student, problem, raw, parsed, correct, latency):
+    if type(raw) is not str:
+      raw = json.dumps(raw)
+    if parsed is not None:
+      parsed = repr(parsed)
+    if correct != -1:
+      correct = int(bool(correct))
+    now = time.time()
+    self.pending.append((now, str(student), str(problem), raw, parsed,
+                         correct, latency))
+    if (len(self.pending) >= self.batch_size or
+        now - self.pending[0][0] >= self.flush_interval):
+      self.flush()
+
+  # Reads and grades a student's answers to a problem, and records the
+  # attempt along with how long grading took.
+  # Return: What problem.grade returns, or -1 if an answer can't be read
+  def grade(self, student, key, problem, responses):
+    if type(responses) is not list:
+      responses = [responses]
+    start = default_timer()
+    try:
+      parsed = [AnswerInterpreter.interpret(r) for r in responses]
+      result = problem.grade(parsed)
+    except ParseError:
+      parsed = None
+      result = -1
+    self.record(student, key, responses, parsed, result, default_timer() - start)
+    return result
+
+  def flush(self):
+    if not self.pending:
+      return
+    rows = self.pending
+    self.pending = []
+    with self.db:
+      self.db.executemany('INSERT INTO attempts (time, student, problem, raw, '
+                          'parsed, correct, latency) VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+      for table, column, position in [('problem_totals', 'problem', 2),
+                                      ('student_totals', 'student', 1)]:
+        totals = {}
+        for row in rows:
+          t = totals.setdefault(row[position], [0, 0, 0, 0.0])
+          t[0] += 1
+          t[1] += row[5] == 1
+          t[2] += row[5] == -1
+          t[3] += row[6] or 0.0
+        self.db.executemany('INSERT OR IGNORE INTO %s VALUES (?, 0, 0, 0, 0.0)'
+                            % table, [(name,) for name in totals])
+        self.db.executemany('UPDATE %s SET attempts = attempts + ?, correct = correct + ?, '
+                            'invalid = invalid + ?, latency = latency + ? WHERE %s = ?'
+                            % (table, column),
+                            [tuple(t) + (name,) for name, t in totals.items()])
+
+  def close(self):
+    self.flush()
+    self.db.close()
+
+  def __len__(self):
+    self.flush()
+    return self.db.execute('SELECT COALESCE(SUM(attempts), 0) FROM problem_totals').fetchone()[0]
+
+  # Totals for every problem, or just one, by problem key. Each has the
+  # number of attempts, how many were correct or invalid, the fraction
+  # that were correct and the mean grading latency
+  def problem_stats(self, problem=None):
+    return self.totals('problem_totals', 'problem', problem)
+
+  # The same totals, by student
+  def student_stats(self, student=None):
+    return self.totals('student_totals', 'student', student)
+
+  def totals(self, table, column, name):
+    self.flush()
+    query = 'SELECT * FROM ' + table
+    if name is not None:
+      rows = self.db.execute(query + ' WHERE %s = ?' % column, (str(name),))
+    else:
+      rows = self.db.execute(query)
+    result = {}
+    for name, attempts, correct, invalid, latency in rows:
+      result[name] = {'attempts': attempts, 'correct': correct, 'invalid': invalid,
+                      'correct_rate': correct / float(attempts),
+                      'mean_latency': latency / attempts}
+    return result
+
+  # The problems with the lowest fraction of correct attempts, among those
+  # attempted at least min_attempts times
+  # Return: A list of (problem, correct rate), hardest first
+  def hardest(self, count=10, min_attempts=1):
+    self.flush()
+    return self.db.execute('SELECT problem, correct * 1.0 / attempts AS rate '
+                           'FROM problem_totals WHERE attempts >= ? '
+                           'ORDER BY rate, problem LIMIT ?', (min_attempts, count)).fetchall()
+
+  # A student's attempts in the order they were made, as dicts. With a
+  # limit, only the most recent ones
+  def history(self, student, limit=None):
+    return self.attempts('student', student, limit)
+
+  # Every attempt at one problem, in the order they were made
+  def attempts_on(self, problem, limit=None):
+    return self.attempts('problem', problem, limit)
+
+  def attempts(self, column, name, limit):
+    self.flush()
+    query = 'SELECT * FROM attempts WHERE %s = ? ORDER BY id DESC' % column
+    if limit is not None:
+      rows = self.db.execute(query + ' LIMIT ?', (str(name), limit)).fetchall()
+    else:
+      rows = self.db.execute(query, (str(name),)).fetchall()
+    rows.reverse()
+    return [dict(zip(COLUMNS, row)) for row in rows]
@@ -0,0 +1,194 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+A compact file format for large problem banks
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import os
+import mmap
+import struct
+import tempfile
+import marshal
+from array import array
+from ProblemSet import Problem
+
+# A bank file is laid out as
+#   header     MAGIC, problem count, template count, offset of the index
+#   problems   one marshalled (template number, data, answer, 
+#              ordering_counts, tolerance) per problem
+#   templates  one marshalled question string per distinct question
+#   index      count+1 little endian uint64 offsets of the problems, then
+#              template count+1 offsets of the templates
+# Each question is stored once, however many problems use it. Numbers, 
+# strings and lists of them are stored as they are.
+#
+# marshal's format isn't promised to stay the same between Python
+# versions, so records are written with marshal version 2 and a bank file
+# is meant to be read by the Python 2 that wrote it, not kept as an
+# archive. Keep the problems themselves (or the code that makes them) to
+# rebuild a bank for another Python.
+MAGIC = 'PSMBANK1'
+HEADER = struct.Struct('<8sQQQ')
+OFFSET = struct.Struct('<Q')
+MARSHAL_VERSION = 2
+
+# The only types a record may hold. Types are matched exactly, since
+# marshal refuses subclasses such as numpy's float64.
+PLAIN_TYPES = (type(None), bool, int, long, float, complex, str, unicode)
+
+# True if value is a plain type, or a list or tuple of them
+def storable(value):
+  if type(value) in (list, tuple):
+    return all(storable(v) for v in value)
+  return type(value) in PLAIN_TYPES
+
+# Writes problems, which may be any iterable (a generator works), to a bank
+# file. Problems are written one at a time, so only their offsets and the
+# distinct questions are held in memory. The bank is written to a file 
+# next to path and only renamed to path once it is complete, so a problem
+# that can't be stored raises ValueError and leaves path as it was.
+# Return: The number of problems written
+def write_bank(path, problems):
+  directory = os.path.dirname(os.path.abspath(path))
+  handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+  try:
+    with os.fdopen(handle, 'wb') as f:
+      count = write_records(f, problems)
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temp_path, 0666 & ~umask) # mkstemp makes it private
+    if os.name == 'nt' and os.path.exists(path):
+      os.remove(path) # rename won't replace a file on Windows
+    os.rename(temp_path, path)
+  except BaseException:
+    os.remove(temp_path)
+    raise
+  return count
+
+# Writes the header, records and index of a bank to the open file f
+# Return: The number of problems written
+def write_records(f, problems):
+  problem_offsets = array('L') # Much smaller than a list of ints
+  templates = {}
+  template_order = []
+  f.write(HEADER.pack(MAGIC, 0, 0, 0)) # Filled in at the end
+  offset = HEADER.size
+  for p in problems:
+    if p.eval_function != 0:
+      raise ValueError('Problems with an eval_function can\'t be stored')
+    if p.question not in templates:
+      templates[p.question] = len(template_order)
+      template_order.append(p.question)
+    values = (templates[p.question], p.data, p.answer_key(),
+              p.ordering_counts, p.tolerance)
+    if not storable(values) or type(p.question) not in (str, unicode):
+      raise ValueError('Problem %d holds values that can\'t be stored; '
+                       'only numbers, strings and lists of them can be'
+                       % (len(problem_offsets)))
+    record = marshal.dumps(values, MARSHAL_VERSION)
+    problem_offsets.append(offset)
+    f.write(record)
+    offset += len(record)
+  problem_offsets.append(offset)
+
+  template_offsets = []
+  for question in template_order:
+    record = marshal.dumps(question, MARSHAL_VERSION)
+    template_offsets.append(offset)
+    f.write(record)
+    offset += len(record)
+  template_offsets.append(offset)
+
+  index_offset = offset
+  for start in problem_offsets:
+    f.write(OFFSET.pack(start))
+  for start in template_offsets:
+    f.write(OFFSET.pack(start))
+  count = len(problem_offsets) - 1
+  f.seek(0)
+  f.write(HEADER.pack(MAGIC, count, len(template_order), index_offset))
+  return count
+
+
+
+# A bank file opened for reading. The file is memory mapped and nothing is
+# decoded until it is asked for, so opening takes the same time whatever
+# the size of the bank. bank[i] builds the i-th Problem on demand.
+class MappedBank:
+  def __init__(self, path):
+    self.file = open(path, 'rb')
+    self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, self.count, self.template_count, self.index_offset = \
+      HEADER.unpack_from(self.map, 0)
+    if magic != MAGIC or self.index_offset < HEADER.size:
+      self.close()
+      raise ValueError(path + ' is not a complete problem bank')
+    self.template_index = self.index_offset + OFFSET.size*(self.count + 1)
+    self.questions = {} # Questions decoded so far, by template number
+
+  def __len__(self):
+    return self.count
+
+  def __getitem__(self, i):
+    if i < 0:
+      i += self.count
+    if not 0 <= i < self.count:
+      raise IndexError('problem bank index out of range')
+    start, end = self.span(self.index_offset, i)
+    template, data, answer, ordering_counts, tolerance = \
+      marshal.loads(self.map[start:end])
+    p = Problem()
+    p.question = self.question(template)
+    p.data = data
+    p.answer = answer
+    p.ordering_counts = ordering_counts
+    p.tolerance = tolerance
+    return p
+
+  def __iter__(self):
+    for i in xrange(self.count):
+      yield self[i]
+
+  # The question for a template number, decoded once
+  def question(self, template):
+    question = self.questions.get(template)
+    if question is None:
+      start, end = self.span(self.template_index, template)
+      question = marshal.loads(self.map[start:end])
+      self.questions[template] = question
+    return question
+
+  # Reads the start and end of the i-th record from an offset table
+  def span(self, table, i):
+    position = table + OFFSET.size*i
+    return OFFSET.unpack_from(self.map, position)[0], \
+           OFFSET.unpack_from(self.map, position + OFFSET.size)[0]
+
+  def close(self):
+    self.map.close()
+    self.file.close()
@@ -0,0 +1,236 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Grades a whole class of submissions across several processes
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import csv
+import json
+import time
+import itertools
+import multiprocessing
+import AnswerInterpreter
+from AnswerInterpreter import ParseError
+from GradeCache import GradeCache
+
+# Frozen problems held by each worker process, filled in once by
+# init_worker. eval_functions must be module level functions so that they
+# can be pickled
+_worker_problems = {}
+_worker_cache = None # The worker's GradeCache, when results are cached
+
+# With a cache_size, the worker remembers that many grading results, so a
+# guess it has already graded for a problem isn't graded again
+def init_worker(problems, cache_size=0):
+  global _worker_cache
+  _worker_problems.clear()
+  _worker_problems.update(problems)
+  _worker_cache = GradeCache(cache_size) if cache_size else None
+
+# The statistics of this process's GradeCache, or None if it has none
+def cache_stats():
+  if _worker_cache is None:
+    return None
+  return _worker_cache.stats()
+
+# Grades one submission of (student, problem key, responses). Responses
+# may be raw strings, which are interpreted first.
+# Return: (student, problem key, result), where result is True, False, or
+# -1 if the submission can't be graded
+def grade_submission(submission):
+  student, key, responses = submission
+  p = _worker_problems.get(key)
+  if p is None:
+    return (student, key, -1)
+  if type(responses) is not list:
+    responses = [responses]
+  try:
+    guess = [AnswerInterpreter.interpret(r) for r in responses]
+  except ParseError:
+    return (student, key, -1)
+  if _worker_cache is not None:
+    return (student, key, _worker_cache.grade(p, guess))
+  return (student, key, p.grade(guess))
+
+# Grades every submission against problems, a dict of Problems by key.
+# submissions is any iterable of (student, problem key, responses). The
+# problems are validated here and sent to each worker once, then
+# submissions are handed out chunksize at a time. Results are yielded in
+# the same order as the submissions, whatever order the workers finish in.
+# At most two windows of submissions are read ahead of the results that
+# have been yielded, so a slow consumer holds back reading instead of
+# letting it pile up in memory. processes defaults to one per core. With
+# processes=1 everything is graded in this process, and cache_stats shows
+# how well caching did. cache_size is passed on to init_worker
+def grade_submissions(problems, submissions, processes=None, chunksize=500,
+                      window=20000, cache_size=0):
+  frozen = {}
+  for key in problems:
+    frozen[key] = problems[key].freeze()
+    if frozen[key] == -1:
+      print 'Problem ' + str(key) + ' is not valid and can\'t be graded.'
+      return
+
+  if processes == 1:
+    init_worker(frozen, cache_size)
+    for submission in submissions:
+      yield grade_submission(submission)
+    return
+
+  pool = multiprocessing.Pool(processes, init_worker, (frozen, cache_size))
+  try:
+    for result in windowed_imap(pool, grade_submission, submissions, window,
+                                chunksize):
+      yield result
+    pool.close()
+  finally:
+    pool.terminate()
+    pool.join()
+
+# Maps function over items in pool, like pool.imap, but reads items a
+# window at a time instead of all at once. At most two windows are handed
+# out ahead of the results that have been yielded, so a slow consumer
+# holds back reading instead of letting it pile up in memory. With
+# ordered unset, results within a window come back as they finish
+def windowed_imap(pool, function, items, window, chunksize=1, ordered=True):
+  imap = pool.imap if ordered else pool.imap_unordered
+  items = iter(items)
+  in_flight = []
+  while True:
+    batch = list(itertools.islice(items, window))
+    if batch:
+      in_flight.append(imap(function, batch, chunksize))
+    if not in_flight:
+      break
+    # Keep the workers busy on the next window while this one drains
+    if batch and len(in_flight) < 2:
+      continue
+    for result in in_flight.pop(0):
+      yield result
+
+
+
+# Reads submissions lazily from a .jsonl or .csv file. JSON lines look like
+# {"student": "ann", "problem": 3, "responses": ["1+j", "1-j"]}. A CSV file
+# has a header, the student and problem in the first two columns and one
+# response in each column after that. Problem keys are matched to the keys
+# of problems, so "3" in a file finds problem 3. Text that isn't ASCII is
+# read as UTF-8 bytes. A row that can't be read, such as a malformed JSON
+# line or one without a student or problem, is left out and its line
+# number is appended to skipped, if a list is given, and reading goes on.
+# Yields: (student, problem key, responses)
+def read_submissions(path, problems, skipped=None):
+  keys = {}
+  for key in problems:
+    keys[str(key)] = key
+  with open(path, 'rb') as f:
+    if path.endswith('.csv'):
+      rows = csv.reader(f)
+      next(rows, None) # Header
+      for number, row in enumerate(rows, 2):
+        if not row:
+          continue
+        if len(row) < 2:
+          if skipped is not None:
+            skipped.append(number)
+          continue
+        yield (row[0], keys.get(row[1], row[1]), [r for r in row[2:] if r != ''])
+    else:
+      for number, line in enumerate(f, 1):
+        if not line.strip():
+          continue
+        try:
+          record = json.loads(line)
+          responses = record.get('responses', record.get('response'))
+          # json gives unicode, but interpret only reads str
+          if type(responses) is list:
+            responses = [to_bytes(r) for r in responses]
+          else:
+            responses = to_bytes(responses)
+          problem = to_bytes(record['problem'])
+          student = to_bytes(record['student'])
+        except (ValueError, KeyError, TypeError, AttributeError):
+          if skipped is not None:
+            skipped.append(number)
+          continue
+        yield (student, keys.get(str(problem), problem), responses)
+
+# Turns unicode from json into a UTF-8 str, and leaves anything else alone
+def to_bytes(value):
+  if isinstance(value, unicode):
+    return value.encode('utf-8')
+  return value
+
+# Grades every submission in in_path and writes the results to out_path, 
+# as .jsonl or .csv. Rows stream through: results are written buffer_size
+# at a time, and reading waits on grading and writing, so memory stays
+# flat however long the file is. Progress is printed every report_every 
+# rows. Other options are passed to grade_submissions.
+# Return: The number of rows graded
+def grade_file(problems, in_path, out_path, buffer_size=1000,
+               report_every=100000, **options):
+  as_csv = out_path.endswith('.csv')
+  start = time.time()
+  count = 0
+  with open(out_path, 'wb') as out:
+    writer = csv.writer(out) if as_csv else None
+    if as_csv:
+      writer.writerow(['student', 'problem', 'result'])
+    buffered = []
+    skipped = []
+    submissions = read_submissions(in_path, problems, skipped)
+    for student, key, result in grade_submissions(problems, submissions, **options):
+      if as_csv:
+        buffered.append([student, key, result])
+      else:
+        buffered.append(json.dumps({'student': student, 'problem': key,
+                                    'result': result}) + '\n')
+      count += 1
+      if len(buffered) >= buffer_size:
+        write_rows(out, writer, buffered)
+        buffered = []
+      if count % report_every == 0:
+        print 'Graded %d rows (%.0f rows/sec)' % (count, count/(time.time() - start))
+    write_rows(out, writer, buffered)
+  elapsed = time.time() - start
+  print 'Graded %d rows in %.1f seconds (%.0f rows/sec)' % (
+    count, elapsed, count/elapsed if elapsed else 0)
+  if skipped:
+    print 'Skipped %d rows that couldn\'t be read, starting at line %d' % (
+      len(skipped), skipped[0])
+  if options.get('processes') == 1 and options.get('cache_size'):
+    stats = cache_stats()
+    print '%.0f%% of answers were graded from the cache, saving about %.1f seconds' % (
+      100*stats['hit_rate'], stats['saved_seconds'])
+  return count
+
+def write_rows(out, writer, rows):
+  if writer is not None:
+    writer.writerows(rows)
+  else:
+    out.write(''.join(rows))
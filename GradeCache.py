@@ -0,0 +1,133 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Remembers grading results for answers that have been seen before
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from timeit import default_timer
+
+# Remembers what problem.grade returned for each guess, so the many
+# students who give the same answer to the same problem are only graded
+# once. Results are keyed on everything grading depends on, the problem's
+# answers, tolerance, ordering_counts and eval_function, and a canonical
+# form of the parsed guess. Values keep their type, since 2, 2.0 and 2+0j
+# aren't always graded alike, and guesses to problems whose answers can
+# come in any order are sorted. Only the size most recently used results
+# are kept.
+#
+# Keying on a problem's contents rather than the object means the problems
+# handed out fresh on every lookup by a ProblemBank or MappedBank share
+# their results, and a Problem that is changed after it has been graded
+# simply gets new keys.
+class GradeCache:
+  def __init__(self, size=100000):
+    self.size = size
+    self.clear()
+
+  # Forgets every result and resets the statistics
+  def clear(self):
+    self.links = {} # Key to its [previous, next, key, result] link
+    self.root = [] # Links form a circle through root, oldest first
+    self.root[:] = [self.root, self.root, None, None]
+    self.hits = 0
+    self.misses = 0
+    self.uncached = 0 # Guesses that couldn't be keyed, such as lists
+    self.evictions = 0
+    self.grade_time = 0.0 # Seconds spent grading misses
+
+  def __len__(self):
+    return len(self.links)
+
+  # Grades a guess the same way problem.grade does
+  # Return: True or False, or -1 if the guess can't be graded
+  def grade(self, problem, guess):
+    if type(guess) is not list:
+      guess = [guess]
+    key = self.key(problem, guess)
+    try:
+      link = self.links.get(key)
+    except TypeError: # Something in the guess can't be hashed
+      self.uncached += 1
+      return problem.grade(guess)
+    if link is not None:
+      # Move it to the newest end of the circle
+      link_prev, link_next = link[0], link[1]
+      link_prev[1] = link_next
+      link_next[0] = link_prev
+      root = self.root
+      last = root[0]
+      last[1] = root[0] = link
+      link[0] = last
+      link[1] = root
+      self.hits += 1
+      return link[3]
+
+    self.misses += 1
+    start = default_timer()
+    result = problem.grade(guess)
+    self.grade_time += default_timer() - start
+    root = self.root
+    last = root[0]
+    link = [last, root, key, result]
+    last[1] = root[0] = self.links[key] = link
+    if len(self.links) > self.size:
+      oldest = root[1]
+      root[1] = oldest[1]
+      oldest[1][0] = root
+      del self.links[oldest[2]]
+      self.evictions += 1
+    return result
+
+  # The cache key for a guess to a problem
+  def key(self, problem, guess):
+    values = [(type(value), value) for value in guess]
+    if (len(values) > 1 and not problem.ordering_counts and
+        problem.eval_function == 0):
+      values.sort(key=hash_or_id)
+    answers = tuple([(type(answer), answer) for answer in problem.answer_key()])
+    return (answers, problem.tolerance, problem.ordering_counts,
+            problem.eval_function, tuple(values))
+
+  # Counts of what the cache has done. hit_rate is the fraction of graded
+  # guesses that were answered from the cache, and saved_seconds estimates
+  # the grading time that saved from the average cost of a miss
+  def stats(self):
+    lookups = self.hits + self.misses + self.uncached
+    return {'size': len(self.links), 'hits': self.hits, 'misses': self.misses,
+            'uncached': self.uncached, 'evictions': self.evictions,
+            'hit_rate': self.hits / float(lookups) if lookups else 0.0,
+            'saved_seconds': self.hits * self.grade_time / self.misses if self.misses else 0.0}
+
+# Sort key that puts equal guess values next to each other without
+# comparing them, since complex numbers can't be ordered. A guess with
+# unhashable values is never cached, so any order does for them
+def hash_or_id(value):
+  try:
+    return hash(value)
+  except TypeError:
+    return id(value)
@@ -0,0 +1,199 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Optional timers for the stages of parsing and grading
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import json
+import functools
+from timeit import default_timer
+from bisect import bisect_left
+
+import AnswerInterpreter
+import ProblemSet
+from ProblemSet import Problem, FrozenProblem
+
+# Nothing here costs anything until enable() is called. It swaps timed
+# wrappers in for the functions below, and disable() puts the originals
+# back. Times include any stages called from inside a stage. Each process
+# keeps its own numbers, so pool workers report separately. Callers look
+# stages up on their module when they call them, as in
+# AnswerInterpreter.interpret(r), so they pick up the timed wrapper. With
+# the parse cache on, ParseCache.interpret counts every lookup and
+# interpret_string only the misses.
+
+# Stages that get a timer and a call count: (owner, function name)
+STAGES = [(AnswerInterpreter, 'interpret'),
+          (AnswerInterpreter.ParseCache, 'interpret'),
+          (AnswerInterpreter, 'interpret_string'),
+          (AnswerInterpreter, 'predict_number'),
+          (AnswerInterpreter, 'predict_complex'),
+          (AnswerInterpreter, 'evaluate'),
+          (AnswerInterpreter, 'apply_operator'),
+          (AnswerInterpreter, 'interpret_array'),
+          (ProblemSet, 'match_unordered'),
+          (Problem, 'test_single_answer'),
+          (Problem, 'default_check__'),
+          (FrozenProblem, 'default_check__'),
+          (Problem, 'check_batch')]
+
+# Grading entry points that also get a latency histogram per problem
+GRADERS = [(Problem, 'check'),
+           (Problem, 'grade'),
+           (FrozenProblem, 'grade')]
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = [1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+           1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1]
+
+class StageTimer:
+  def __init__(self):
+    self.calls = 0
+    self.seconds = 0.0
+    self.slowest = 0.0
+
+  def add(self, seconds):
+    self.calls += 1
+    self.seconds += seconds
+    if seconds > self.slowest:
+      self.slowest = seconds
+
+# Counts how many latencies fall under each of BUCKETS
+class Histogram:
+  def __init__(self):
+    self.counts = [0] * (len(BUCKETS) + 1) # The last one is everything slower
+    self.count = 0
+    self.sum = 0.0
+
+  def observe(self, seconds):
+    self.counts[bisect_left(BUCKETS, seconds)] += 1
+    self.count += 1
+    self.sum += seconds
+
+  # Running totals, as (upper bound, count) with '+Inf' last
+  def cumulative(self):
+    total = 0
+    result = []
+    for bound, count in zip(BUCKETS + ['+Inf'], self.counts):
+      total += count
+      result.append((bound, total))
+    return result
+
+timers = {}     # StageTimer by stage name
+histograms = {} # Histogram of grading latency by question
+_originals = {} # Functions replaced while enabled, by (owner, name)
+
+def stage_name(owner, name):
+  return owner.__name__ + '.' + name
+
+def timed(function, timer):
+  @functools.wraps(function)
+  def wrapper(*args, **kwargs):
+    start = default_timer()
+    try:
+      return function(*args, **kwargs)
+    finally:
+      timer.add(default_timer() - start)
+  return wrapper
+
+# Grading methods are timed per problem, by their question
+def timed_grader(function, timer):
+  @functools.wraps(function)
+  def wrapper(self, *args, **kwargs):
+    start = default_timer()
+    try:
+      return function(self, *args, **kwargs)
+    finally:
+      elapsed = default_timer() - start
+      timer.add(elapsed)
+      histogram = histograms.get(self.question)
+      if histogram is None:
+        histogram = histograms[self.question] = Histogram()
+      histogram.observe(elapsed)
+  return wrapper
+
+def enable():
+  if _originals:
+    return
+  for owners, wrap in [(STAGES, timed), (GRADERS, timed_grader)]:
+    for owner, name in owners:
+      original = owner.__dict__[name]
+      timer = timers.setdefault(stage_name(owner, name), StageTimer())
+      _originals[(owner, name)] = original
+      setattr(owner, name, wrap(original, timer))
+
+def disable():
+  for (owner, name), original in _originals.items():
+    setattr(owner, name, original)
+  _originals.clear()
+
+def reset():
+  timers.clear()
+  histograms.clear()
+  # Timers already wrapped in keep counting, so hand them out again
+  if _originals:
+    disable()
+    enable()
+
+def stats():
+  result = {'stages': {}, 'problems': {}}
+  for name, timer in timers.items():
+    if timer.calls:
+      result['stages'][name] = {'calls': timer.calls, 'seconds': timer.seconds,
+                                'mean_us': 1e6*timer.seconds/timer.calls,
+                                'slowest_us': 1e6*timer.slowest}
+  for question, histogram in histograms.items():
+    result['problems'][question] = {
+      'count': histogram.count, 'seconds': histogram.sum,
+      'buckets': [[str(bound), count] for bound, count in histogram.cumulative()]}
+  return result
+
+def to_json():
+  return json.dumps(stats(), indent=2, sort_keys=True)
+
+# Quotes a label value for the Prometheus text format
+def label(value):
+  return '"' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+# The numbers in the Prometheus text exposition format
+def to_prometheus():
+  lines = ['# TYPE problemset_stage_calls_total counter']
+  for name in sorted(timers):
+    lines.append('problemset_stage_calls_total{stage=%s} %d' % (label(name), timers[name].calls))
+  lines.append('# TYPE problemset_stage_seconds_total counter')
+  for name in sorted(timers):
+    lines.append('problemset_stage_seconds_total{stage=%s} %r' % (label(name), timers[name].seconds))
+  lines.append('# TYPE problemset_check_seconds histogram')
+  for question in sorted(histograms):
+    histogram = histograms[question]
+    problem = label(question)
+    for bound, count in histogram.cumulative():
+      lines.append('problemset_check_seconds_bucket{problem=%s,le="%s"} %d' % (problem, bound, count))
+    lines.append('problemset_check_seconds_sum{problem=%s} %r' % (problem, histogram.sum))
+    lines.append('problemset_check_seconds_count{problem=%s} %d' % (problem, histogram.count))
+  return '\n'.join(lines) + '\n'
@@ -0,0 +1,246 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Columnar storage for large problem banks held in memory
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import sys
+
+import numpy
+from ProblemSet import Problem, FrozenProblem
+
+# The numpy type of the column that holds values of each Python type. Any
+# other value, such as a string, an AnswerSet or an Expression, is kept as
+# it is in an object column
+COLUMN_TYPES = {int: numpy.int64, float: numpy.float64, complex: numpy.complex128}
+
+# A bank of problems held in memory as numpy columns instead of one Problem
+# object per problem. Problems that share a question, their settings and
+# the types of their data and answers are stored together, one column for
+# each piece of data and each answer, so the question and settings are
+# kept once per group rather than once per problem. bank[i] hands out a
+# read-only view of the i-th problem that can be asked, checked and graded
+# like a Problem.
+#
+# Columns are written in place and double in size when they fill up, like
+# a list, so adding problems one at a time with append costs no more than
+# adding them all at once. compact gives back the room kept for growth.
+class ProblemBank:
+  def __init__(self, problems=()):
+    self.groups = []      # A ColumnGroup for each layout, in order of first use
+    self.group_index = {} # Layout to its position in self.groups
+    self.group_of = numpy.zeros(0, dtype=numpy.int32) # Group of each problem
+    self.row_of = numpy.zeros(0, dtype=numpy.int32)   # Its row in that group
+    self.count = 0
+    self.extend(problems)
+
+  # Adds problems, which may be any iterable (a generator works), to the
+  # end of the bank. An answer that is a function of the data is worked
+  # out as the problem is added
+  # Return: The number of problems added
+  def extend(self, problems):
+    start = self.count
+    for p in problems:
+      answer = p.answer_key()
+      if type(answer) not in (list, tuple):
+        raise ValueError('Answers must be a list to be stored in a bank')
+      layout = (p.question, p.ordering_counts, p.tolerance, p.eval_function,
+                tuple([COLUMN_TYPES.get(type(value), object) for value in p.data]),
+                tuple([COLUMN_TYPES.get(type(value), object) for value in answer]))
+      number = self.group_index.get(layout)
+      if number is None:
+        number = len(self.groups)
+        self.groups.append(ColumnGroup(p, layout[4], layout[5]))
+        self.group_index[layout] = number
+      row = self.groups[number].add(p.data, answer)
+      if self.count == len(self.group_of):
+        self.group_of = grow(self.group_of)
+        self.row_of = grow(self.row_of)
+      self.group_of[self.count] = number
+      self.row_of[self.count] = row
+      self.count += 1
+    return self.count - start
+
+  def append(self, p):
+    self.extend([p])
+
+  # Shrinks every column to the rows in use, once the bank is complete
+  def compact(self):
+    self.group_of = self.group_of[:self.count].copy()
+    self.row_of = self.row_of[:self.count].copy()
+    for group in self.groups:
+      group.compact()
+
+  def __len__(self):
+    return self.count
+
+  def __getitem__(self, i):
+    count = self.count
+    if i < 0:
+      i += count
+    if not 0 <= i < count:
+      raise IndexError('problem bank index out of range')
+    return ProblemView(self.groups[self.group_of.item(i)], self.row_of.item(i))
+
+  def __iter__(self):
+    for i in xrange(len(self)):
+      yield self[i]
+
+  # The distinct questions in the bank, each stored once
+  def questions(self):
+    return sorted(set(group.settings['question'] for group in self.groups))
+
+  # Bytes the bank takes up: its columns, including any room kept for
+  # growth, the values in its object columns and the question of each group
+  def memory(self):
+    seen = set()
+    total = self.group_of.nbytes + self.row_of.nbytes
+    for group in self.groups:
+      total += deep_size(group.settings['question'], seen)
+      for column in group.columns:
+        total += column.nbytes
+        if column.dtype == object:
+          total += sum(deep_size(value, seen) for value in column[:group.count])
+    return total
+
+  def memory_per_problem(self):
+    if len(self) == 0:
+      return 0.0
+    return self.memory() / float(len(self))
+
+
+
+# The problems in a bank that share a layout. settings holds everything a
+# FrozenProblem works out apart from the data and answers, once for the
+# whole group. columns holds one column for each piece of data and then
+# one for each answer. Only the first count rows are in use
+class ColumnGroup:
+  def __init__(self, p, data_types, answer_types):
+    frozen = p.freeze()
+    if frozen == -1:
+      raise ValueError('Invalid problems can\'t be stored in a bank')
+    self.settings = dict(frozen.__dict__)
+    del self.settings['data']
+    del self.settings['answer']
+    self.width = len(data_types)
+    self.columns = [numpy.zeros(0, dtype=t) for t in data_types + answer_types]
+    self.count = 0
+
+  # Writes one problem's data and answers into the next row
+  # Return: The row
+  def add(self, data, answer):
+    row = self.count
+    if self.columns and row == len(self.columns[0]):
+      self.columns = [grow(column) for column in self.columns]
+    for column, value in zip(self.columns, list(data) + list(answer)):
+      column[row] = value # One at a time, so lists in object columns stay whole
+    self.count += 1
+    return row
+
+  def compact(self):
+    self.columns = [column[:self.count].copy() for column in self.columns]
+
+  # The data and answers in a row, as plain Python values
+  def row(self, i):
+    values = [column.item(i) for column in self.columns]
+    return tuple(values[:self.width]), tuple(values[self.width:])
+
+
+
+# Returns a copy of a column with room for twice as many values
+def grow(column):
+  larger = numpy.zeros(max(2 * len(column), 16), dtype=column.dtype)
+  larger[:len(column)] = column
+  return larger
+
+
+
+# One problem in a ProblemBank. It is a FrozenProblem whose settings come
+# from its group, so nothing is validated or worked out when it is made,
+# and thaw gives back an ordinary Problem that can be changed
+class ProblemView(FrozenProblem):
+  def __init__(self, group, row):
+    self.__dict__.update(group.settings)
+    self.__dict__['data'], self.__dict__['answer'] = group.row(row)
+
+
+
+# The bytes taken up by an object and everything it holds that hasn't been
+# counted yet. Follows lists, tuples, dicts and the attributes of Problems
+def deep_size(obj, seen):
+  if id(obj) in seen:
+    return 0
+  seen.add(id(obj))
+  size = sys.getsizeof(obj)
+  if isinstance(obj, (list, tuple)):
+    size += sum(deep_size(value, seen) for value in obj)
+  elif isinstance(obj, dict):
+    size += sum(deep_size(key, seen) + deep_size(value, seen)
+                for key, value in obj.iteritems())
+  elif isinstance(obj, Problem):
+    size += deep_size(obj.__dict__, seen)
+  return size
+
+# The average bytes per problem of a list of Problem objects, counting
+# values they share only once, for comparison with memory_per_problem
+def object_memory_per_problem(problems):
+  if len(problems) == 0:
+    return 0.0
+  seen = set()
+  return sum(deep_size(p, seen) for p in problems) / float(len(problems))
+
+
+
+def main():
+  from ProblemGenerator import ProblemGenerator
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+  def quadratics(rand, size):
+    return numpy.column_stack([rand.randint(1, 100, size),
+                               rand.randint(-100, 100, size),
+                               rand.randint(-100, 100, size)])
+  def complex_numbers(rand, size):
+    return rand.randint(-1000, 1000, (size, 1)) + 1j * rand.randint(-1000, 1000, (size, 1))
+  generators = [ProblemGenerator("What are the roots of %0x^2 + %1x + %2?", quadratics,
+                                 ['(-%1 + sqrt(%1^2 - 4%0%2)) / (2%0)',
+                                  '(-%1 - sqrt(%1^2 - 4%0%2)) / (2%0)']),
+                ProblemGenerator("What is the modulus (magnitude) of %0?", complex_numbers,
+                                 ['abs(%0)'], accept=lambda data: data[0] != 0),
+                ProblemGenerator("Is %0 even or odd?",
+                                 lambda rand, size: rand.randint(0, 10**9, (size, 1)),
+                                 lambda data: ['odd' if data[0] % 2 else 'even'])]
+  problems = []
+  for generator in generators:
+    problems.extend(generator.generate(count // len(generators)))
+  bank = ProblemBank(problems)
+  bank.compact()
+  print '%d problems in %d groups' % (len(bank), len(bank.groups))
+  print '  Problem objects  %8.1f bytes per problem' % object_memory_per_problem(problems)
+  print '  ProblemBank      %8.1f bytes per problem' % bank.memory_per_problem()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,131 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Generates endless variants of a problem from a template
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import hashlib
+import collections
+import numpy
+from ProblemSet import Problem, compile_template
+from AnswerExpression import AnswerKey
+
+# Makes Problems from a question template, a data sampler and an answer
+# function. The sampler is called as sampler(rand, size) with a
+# numpy.random.RandomState and returns size rows of data at once, as an
+# array or a list of lists. answer(data) returns the answer list for one
+# row. answer can instead be a list of answer keys written as strings for
+# compile_answer, such as ["abs(%0)", "phase(%0)"], which are worked out
+# for a whole batch of rows at a time. accept(data), if given, can turn
+# down rows that make bad problems. With lazy set, no answers are worked
+# out at all: each Problem gets the answer function itself, which is only
+# called when the problem is first checked.
+class ProblemGenerator:
+  def __init__(self, question, sampler, answer, accept=None,
+               ordering_counts=False, tolerance=0.001, batch_size=1024,
+               lazy=False):
+    self.question = question
+    self.sampler = sampler
+    self.answer = answer
+    if type(answer) is list:
+      self.answer = AnswerKey(answer)
+    self.lazy = lazy
+    self.accept = accept
+    self.ordering_counts = ordering_counts
+    self.tolerance = tolerance
+    self.batch_size = batch_size
+    compile_template(question)
+
+  # Yields up to count distinct Problems, or forever if count is None. The
+  # same seed always gives the same Problems in the same order. Repeated
+  # data rows are skipped. Only a digest of each row is remembered, and
+  # generation stops once max_stale batches in a row bring nothing new,
+  # since every variant has then most likely been made.
+  #
+  # The digests grow with the number of distinct rows drawn, about 80
+  # bytes each, so a million problems keep about 80MB. With window set,
+  # only the last window distinct rows are remembered and memory stays
+  # fixed, but a row last seen longer ago than that can come up again,
+  # and a generator with fewer than window variants is the only kind
+  # that still stops by itself.
+  def generate(self, count=None, seed=0, max_stale=10, window=None):
+    rand = numpy.random.RandomState(seed)
+    seen = set()
+    recent = collections.deque() # Digests in seen, oldest first
+    made = 0
+    stale = 0
+    while (count is None or made < count) and stale < max_stale:
+      array = batch = self.sampler(rand, self.batch_size)
+      if hasattr(batch, 'tolist'):
+        batch = batch.tolist() # Plain Python numbers, not numpy scalars
+      stale += 1
+      fresh = [] # Indices of the new rows in this batch
+      for i, data in enumerate(batch):
+        key = row_digest(data)
+        if key in seen:
+          continue
+        seen.add(key)
+        if window is not None:
+          recent.append(key)
+          if len(recent) > window:
+            seen.discard(recent.popleft())
+        if self.accept is not None and not self.accept(data):
+          continue
+        fresh.append(i)
+        if count is not None and made + len(fresh) >= count:
+          break
+      if not fresh:
+        continue
+      stale = 0
+      rows = [batch[i] for i in fresh]
+      if self.lazy:
+        answers = [self.answer] * len(rows)
+      elif isinstance(self.answer, AnswerKey):
+        answers = self.answer.evaluate_rows(numpy.asarray(array)[fresh])
+      else:
+        answers = [self.answer(data) for data in rows]
+      for data, answer in zip(rows, answers):
+        yield self.make_problem(data, answer)
+        made += 1
+
+  # Builds the Problem for one row of data
+  def make_problem(self, data, answer=None):
+    p = Problem()
+    p.question = self.question
+    p.data = data
+    p.answer = answer if answer is not None else self.answer(data)
+    p.ordering_counts = self.ordering_counts
+    p.tolerance = self.tolerance
+    return p
+
+
+
+# A short fingerprint of a row of data. Python's own tuple hash collides
+# far too often on small integers to be trusted here
+def row_digest(data):
+  return hashlib.md5(repr(tuple(data))).digest()[:8]
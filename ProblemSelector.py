@@ -0,0 +1,236 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Picks the next problem for each student by topic and difficulty
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import math
+from random import Random
+
+import numpy
+
+# Chooses the next problem for each of many students from a bank of any
+# size. Every problem has a topic and a difficulty, and every student has
+# an ability in each topic, on the same scale: a student of ability a gets
+# a problem of difficulty d right with probability 1 / (1 + exp(d - a)).
+# Abilities start at 0 and move toward the student's results as they are
+# recorded, rate at a time. The next problem in a topic is the one the
+# student hasn't been given yet whose difficulty is closest to where they
+# should get it right target of the time, give or take spread.
+#
+# The problems in each topic are sorted by difficulty once, up front, so a
+# pick is a binary search plus a step past any problems the student has
+# already been given. Problems are known by their position in topics and
+# difficulties, or by keys if they are given.
+class ProblemSelector:
+  def __init__(self, topics, difficulties, keys=None, target=0.7, rate=0.4,
+               spread=0.2, seed=0):
+    difficulties = numpy.asarray(difficulties, dtype=numpy.float64)
+    names, topic_of = numpy.unique(numpy.asarray(topics), return_inverse=True)
+    if len(topic_of) != len(difficulties):
+      raise ValueError('Every problem needs a topic and a difficulty')
+    order = numpy.lexsort((difficulties, topic_of))
+    bounds = numpy.searchsorted(topic_of[order], numpy.arange(len(names) + 1))
+    self.topics = names.tolist()
+    self.index = {} # Topic to (sorted difficulties, problem positions)
+    for t, topic in enumerate(self.topics):
+      members = order[bounds[t]:bounds[t + 1]]
+      self.index[topic] = (difficulties[members], members)
+    self.sizes = [(topic, len(self.index[topic][1])) for topic in self.topics]
+    self.topic_of = topic_of
+    self.difficulties = difficulties
+    self.keys = keys
+    self.positions = None # Key to position, when keys are given
+    if keys is not None:
+      if len(keys) != len(difficulties):
+        raise ValueError('Every problem needs a key')
+      self.positions = dict((key, i) for i, key in enumerate(keys))
+    self.names = None # str(key) to position, for attempts read from a log
+    self.offset = math.log(1.0 / target - 1) # Difficulty less ability at target
+    self.rate = rate
+    self.spread = spread
+    self.rand = Random(seed)
+    self.students = {}
+
+  def __len__(self):
+    return len(self.difficulties)
+
+  # The state kept for a student, made on first use
+  def student(self, student):
+    state = self.students.get(student)
+    if state is None:
+      state = self.students[student] = StudentState()
+    return state
+
+  def ability(self, student, topic):
+    return self.student(student).abilities.get(topic, 0.0)
+
+  # Picks the next problem for a student and remembers that they were given
+  # it. Without a topic, the topic the student is weakest in is used,
+  # leaving out any they have been given every problem in.
+  # Return: The problem's key, or None if there is nothing left to give
+  def next_problem(self, student, topic=None):
+    state = self.student(student)
+    if topic is None:
+      topic = self.weakest_topic(state)
+      if topic is None:
+        return None
+    i = self.nearest(state, topic)
+    if i is None:
+      return None
+    self.mark(state, i, topic)
+    return self.key(i)
+
+  # Updates a student's ability in the problem's topic after an attempt.
+  # correct is True or False, or -1 for an answer that couldn't be graded,
+  # which changes nothing
+  def record(self, student, problem, correct):
+    self.update(self.student(student), self.position(problem), correct)
+
+  # Replays attempts read back from an AttemptLog, such as log.history(student),
+  # so students pick up where they left off
+  def replay(self, attempts):
+    for attempt in attempts:
+      self.update(self.student(attempt['student']),
+                  self.position_of_name(attempt['problem']), attempt['correct'])
+
+  def update(self, state, i, correct):
+    topic = self.topics[self.topic_of[i]]
+    self.mark(state, i, topic)
+    if correct == -1:
+      return
+    ability = state.abilities.get(topic, 0.0)
+    expected = 1.0 / (1.0 + math.exp(self.difficulties[i] - ability))
+    state.abilities[topic] = ability + self.rate * (int(bool(correct)) - expected)
+    state.attempts[topic] = state.attempts.get(topic, 0) + 1
+
+  # Remembers that a student has seen a problem
+  def mark(self, state, i, topic):
+    if i not in state.seen:
+      state.seen.add(i)
+      state.given[topic] = state.given.get(topic, 0) + 1
+
+  # The topic with the lowest ability that still has problems to give,
+  # fewest attempts first among equals
+  def weakest_topic(self, state):
+    abilities, attempts, given = state.abilities, state.attempts, state.given
+    best = None
+    for topic, size in self.sizes:
+      if given.get(topic, 0) >= size:
+        continue
+      rank = (abilities.get(topic, 0.0), attempts.get(topic, 0), topic)
+      if best is None or rank < best:
+        best = rank
+    if best is None:
+      return None
+    return best[2]
+
+  # The position of the problem in a topic whose difficulty is nearest the
+  # student's target and that they haven't been given. Problems of equal
+  # difficulty are started from at random, so students at the same level
+  # don't all get the same one
+  def nearest(self, state, topic):
+    difficulties, members = self.index[topic]
+    n = len(members)
+    if n == 0 or state.given.get(topic, 0) >= n:
+      return None
+    target = (state.abilities.get(topic, 0.0) + self.offset +
+              self.rand.gauss(0, self.spread))
+    start = int(difficulties.searchsorted(target))
+    if start == n or (start > 0 and target - difficulties.item(start - 1) <
+                                    difficulties.item(start) - target):
+      start -= 1
+    value = difficulties.item(start)
+    low = int(difficulties.searchsorted(value, 'left'))
+    high = int(difficulties.searchsorted(value, 'right'))
+    start = low + int(self.rand.random() * (high - low))
+    i = members.item(start)
+    if i not in state.seen:
+      return i
+    # Walk outward, always taking the closer side next
+    left, right = start - 1, start + 1
+    while left >= 0 or right < n:
+      if right >= n or (left >= 0 and target - difficulties.item(left) <=
+                                      difficulties.item(right) - target):
+        i = members.item(left)
+        left -= 1
+      else:
+        i = members.item(right)
+        right += 1
+      if i not in state.seen:
+        return i
+    return None
+
+  def key(self, i):
+    if self.keys is None:
+      return i
+    return self.keys[i]
+
+  def position(self, problem):
+    if self.positions is None:
+      return problem
+    return self.positions[problem]
+
+  # Attempt logs store problem keys as strings
+  def position_of_name(self, name):
+    if self.keys is None:
+      return int(name)
+    if self.names is None:
+      self.names = dict((str(key), i) for i, key in enumerate(self.keys))
+    return self.names[name]
+
+
+
+# What the selector knows about one student: their ability and number of
+# graded attempts in each topic, and the positions of every problem they
+# have been given or attempted, with a count of them for each topic
+class StudentState:
+  def __init__(self):
+    self.abilities = {}
+    self.attempts = {}
+    self.given = {}
+    self.seen = set()
+
+
+
+# Estimates each problem's difficulty from the totals in an AttemptLog, as
+# the log odds of a wrong answer. Only graded attempts count: invalid ones
+# are left out, as update leaves them out of abilities. prior attempts,
+# half right and half wrong, are added to every problem, so one with no
+# graded attempts comes out at 0
+# Return: A numpy array of difficulties in the order of keys
+def difficulties_from_log(log, keys, prior=2.0):
+  totals = log.problem_stats()
+  difficulties = numpy.zeros(len(keys))
+  for i, key in enumerate(keys):
+    stats = totals.get(str(key))
+    if stats is None:
+      continue
+    wrong = stats['attempts'] - stats['invalid'] - stats['correct']
+    difficulties[i] = math.log((wrong + prior / 2) / (stats['correct'] + prior / 2))
+  return difficulties
@@ -30,16 +30,82 @@ SOFTWARE.
 '''
 
 import re
-import copy
-from AnswerInterpreter import interpret 
+import numbers
+import itertools
+import threading
+from collections import OrderedDict
+import AnswerInterpreter
+from AnswerInterpreter import ParseError
+from AnswerMatcher import match_unordered, has_perfect_matching, AnswerSet
+from AnswerExpression import Expression, AnswerKey, equivalent
 
-class Problem:
-  question = 0
-  data = 0
-  ordering_counts = False
-  answer = 0
-  eval_function = 0
-  tolerance = 0.001
+# numpy is only needed for grading in batches
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# Matches a single variable in a question, such as %0 or %12
+VARIABLE_PATTERN = re.compile(r'%(\d+)')
+
+# A question string split once into literal text and variable slots. The
+# result is a format string that fills in every variable in a single pass,
+# so the same question can be rendered cheaply for many rows of data.
+class Template:
+  def __init__(self, question):
+    self.question = question
+    self.variables = [] # Variable numbers in order of appearance
+    pieces = []
+    last = 0
+    for match in VARIABLE_PATTERN.finditer(question):
+      literal = question[last:match.start()]
+      pieces.append(literal.replace('{', '{{').replace('}', '}}'))
+      var = int(match.group(1))
+      pieces.append('{' + str(var) + '!s}')
+      self.variables.append(var)
+      last = match.end()
+    literal = question[last:]
+    pieces.append(literal.replace('{', '{{').replace('}', '}}'))
+    self.format_string = ''.join(pieces)
+
+  # Returns the question with one row of data filled in
+  def render(self, data):
+    return self.format_string.format(*data)
+
+  # Yields the rendered question for each row of data, one at a time
+  def render_many(self, rows):
+    fill = self.format_string.format
+    for row in rows:
+      yield fill(*row)
+
+# Compiled questions, least recently used first. Bounded, since questions
+# with their data written into the text would otherwise fill it forever
+TEMPLATE_CACHE_SIZE = 1024
+_template_cache = OrderedDict()
+_template_lock = threading.Lock()
+
+# Returns the compiled template for a question, compiling it on first use
+def compile_template(question):
+  with _template_lock:
+    template = _template_cache.pop(question, None)
+    if template is None:
+      template = Template(question)
+    _template_cache[question] = template # Now the most recently used
+    if len(_template_cache) > TEMPLATE_CACHE_SIZE:
+      _template_cache.popitem(last=False)
+  return template
+
+class Problem(object):
+  # Every problem gets its own attributes, so nothing is shared between them
+  def __init__(self):
+    self.question = 0
+    self.data = 0
+    self.ordering_counts = False
+    self.answer = 0
+    self.eval_function = 0
+    self.tolerance = 0.001
+    self.answer_cache = None # (answer function, data, answers) once worked out
+    self.template_cache = None # (question, Template) once compiled
 
   # Checks to see if the entered question is in valid format. 
   # p.question must be set before calling this
@@ -51,16 +117,15 @@ class Problem:
       print "Example: p.question = \"What are the roots of %0x^2 + %1x + %2?\""
       return -1
     
-    # Extract all instances of percent signs followed by numbers
-    variables = re.findall(r'(%\d+)+', self.question)
+    # All instances of percent signs followed by numbers
+    variables = self.compiled_template().variables
 
     # No variables is not invalid, 1 doesn't need any additional checking
     if len(variables) < 2:
       return len(variables)
 
-    var_strip = [int(var.strip('%')) for var in variables]
     #Remove duplicates and sort
-    var_strip = sorted(list(set(var_strip)))
+    var_strip = sorted(list(set(variables)))
 
     #Makes sure sorted list of variables go from zero to len(vars)-1
     if (var_strip[0] == 0 and var_strip[-1] == len(var_strip) - 1):
@@ -97,21 +162,50 @@ class Problem:
       print 'Example: p.answers = [3, 4, \"Blue\", complex(2,4)]' 
       return -1
     #Make sure answer is a list
-    if type(self.answer) is not list:
+    if type(self.answer_key()) is not list:
       print 'Answer must be specified in a list, even if it only has one element!'
+      print 'It may also be a function that is given p.data and returns the answers.'
       return -1
     return True
+
+  # The list of answers. p.answer may instead be a function of the data,
+  # such as an AnswerKey, which is called the first time the answers are
+  # needed. The result is kept until p.answer or p.data changes. A function
+  # that returns a single answer gets it wrapped in a list
+  def answer_key(self):
+    answer = self.answer
+    if not callable(answer):
+      return answer
+    data = tuple(self.data)
+    cache = self.answer_cache
+    if cache is not None and cache[0] is answer and cache[1] == data:
+      return cache[2]
+    result = answer(self.data)
+    if type(result) is not list:
+      result = [result]
+    self.answer_cache = (answer, data, result)
+    return result
     
 
 
+  # Validates the problem once and returns an unchangeable copy of it that
+  # never needs validating again. Use it when the same problem will be
+  # asked or graded many times.
+  # Return: A FrozenProblem, or -1 if the problem is invalid
+  def freeze(self):
+    if self.validate_problem() == -1:
+      return -1
+    return FrozenProblem(self)
+
   # Checks to see if the answer that has been given is correct. Uses the
   # default evaluation function or uses the specified one
+  # Return: True or False, or -1 if the problem or guess is invalid
   def check(self, guess):
     if type(guess) is not list:
       guess = [guess]
     if self.validate_problem() == -1:
       return -1
-    if len(guess) != len(self.answer):
+    if len(guess) != len(self.answer_key()):
       print 'You haven\'t entered the correct amount of answers!'
       return -1
     
@@ -120,44 +214,115 @@ class Problem:
     else:
       match = self.eval_function(guess)
       if match != True and match != False:
-        error("Your evaluation function must return a boolean!") 
+        print "Your evaluation function must return a boolean!"
         return -1
     if (match): print "Correct" 
     else: print "Incorrect"     
+    return match
     
 
 
+  # Grades a guess the same way check does, but quietly. Assumes the
+  # problem has already been validated.
+  # Return: True or False, or -1 if the guess can't be graded
+  def grade(self, guess):
+    if type(guess) is not list:
+      guess = [guess]
+    if len(guess) != len(self.answer_key()):
+      return -1
+    if self.eval_function == 0:
+      return self.default_check__(guess)
+    match = self.eval_function(guess)
+    if match != True and match != False:
+      return -1
+    return match
+
+
+
+  # Grades many guesses at once. guesses is an N x k array (or list of lists)
+  # of numbers, one row per submission and one column per answer. Applies
+  # the same rules as test_single_answer, but as array operations. Answers
+  # that aren't numbers, such as an AnswerSet or an Expression, are graded
+  # a row at a time by grade instead, on the guesses as they were given.
+  # Return: A boolean array of length N, or -1 if the problem is invalid
+  def check_batch(self, guesses):
+    if numpy is None:
+      print 'check_batch requires numpy.'
+      return -1
+    if self.validate_problem() == -1:
+      return -1
+    answer = self.answer_key()
+    given = guesses
+    guesses = numpy.asarray(guesses)
+    if guesses.ndim == 1 and len(answer) == 1:
+      guesses = guesses.reshape(-1, 1)
+    if guesses.ndim != 2 or guesses.shape[1] != len(answer):
+      print 'You haven\'t entered the correct amount of answers!'
+      return -1
+
+    if self.eval_function != 0:
+      return numpy.array([self.eval_function(list(row)) == True
+                          for row in guesses], dtype=bool)
+    if not all(isinstance(a, numbers.Number) for a in answer):
+      # An object array keeps 3 as 3 next to '2x+1', where asarray makes '3'
+      rows = numpy.asarray(given, dtype=object).reshape(guesses.shape).tolist()
+      return numpy.array([self.grade(row) == True for row in rows], dtype=bool)
+    try:
+      guesses = guesses.astype(complex)
+      answer = numpy.array(answer, dtype=complex)
+    except (TypeError, ValueError):
+      print 'check_batch can only grade numerical answers.'
+      return -1
+
+    k = len(answer)
+    if self.ordering_counts or k == 1:
+      return self.test_answer_array(guesses, answer).all(axis=1)
+    # matches[n, i, j] says if guess i of submission n fits answer j
+    matches = self.test_answer_array(guesses[:, :, numpy.newaxis],
+                                     answer[numpy.newaxis, numpy.newaxis, :])
+    # Few answers: try every pairing at once
+    if k <= 4:
+      result = numpy.zeros(len(guesses), dtype=bool)
+      for perm in itertools.permutations(range(k)):
+        result |= matches[:, range(k), perm].all(axis=1)
+      return result
+    return numpy.array([has_perfect_matching([numpy.flatnonzero(row) for row in m])
+                        for m in matches], dtype=bool)
+
+  # Elementwise version of test_single_answer for complex arrays. A guess
+  # whose imaginary part is exactly zero is graded as a real number, which
+  # is what interpret returns for it
+  def test_answer_array(self, guess, correct):
+    guess_real = guess.imag == 0
+    realpart = self.within_tolerance_array(guess.real, correct.real)
+    imagpart = numpy.where(guess_real,
+                           numpy.abs(correct.imag) < self.tolerance,
+                           self.within_tolerance_array(guess.imag, correct.imag))
+    return realpart & imagpart
+
+  # Relative tolerance test on real arrays. Zero answers need an exact zero
+  def within_tolerance_array(self, guess, correct):
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+      close = numpy.abs((guess - correct) / correct) < self.tolerance
+    return numpy.where(correct == 0, guess == 0, close)
+
+
+
   # Does the most basic check on answer. A test for equality.
   def default_check__(self, guess):
+    answer = self.answer_key()
     # Answers have to be in specified order
     if self.ordering_counts:
-      for i in range(len(self.answer)):
-        if not self.test_single_answer(guess[i], self.answer[i]):
+      for i in range(len(answer)):
+        if not self.test_single_answer(guess[i], answer[i]):
           return False
       return True
     else:
-      # Answers can be in any order, make a copy of the answers and remove
-      # Entries as they are found
-      ans_copy = copy.deepcopy(self.answer)
-      guess_copy = copy.deepcopy(guess)
+      # Answers can be in any order. Pair each guess with a distinct answer
       if len(guess) == 1:
-        return self.test_single_answer(guess[0], self.answer[0])
-
-      while len(ans_copy)>0:
-        match = False
-        i = 0
-        for this_one in guess_copy:
-          if self.test_single_answer(this_one,ans_copy[0]):
-            del ans_copy[0]
-            del guess_copy[i]
-            i = i-1
-            match = True
-            break
-          else: match = False
-          i = i+1
-        if not match: 
-          return False
-    return True
+        return self.test_single_answer(guess[0], answer[0])
+      return match_unordered(guess, answer, self.test_single_answer,
+                             self.tolerance)
 
 
   # Verifies the a single answer, doing a check for tolerances, which can
@@ -180,7 +345,15 @@ class Problem:
     if type(guess) in mathlist and type(correct_answer) in mathlist:
       if (correct_answer == 0):
         return guess == 0;
-      return abs((guess-correct_answer)/correct_answer) < self.tolerance
+      return abs((guess-correct_answer)/float(correct_answer)) < self.tolerance
+
+    # Passes if it matches any of the accepted answers
+    if isinstance(correct_answer, AnswerSet):
+      return correct_answer.accepts(guess, self.test_single_answer, self.tolerance)
+
+    # Expressions are compared by their values at random points
+    if isinstance(correct_answer, Expression):
+      return equivalent(guess, correct_answer, self.tolerance)
 
     # Simple comparison for non-math types, or simple math types
     return guess == correct_answer
@@ -188,19 +361,149 @@ class Problem:
 
   def ask(self):
     if self.validate_problem():
-      # Extract all instances of percent signs followed by numbers
-      variables = re.findall(r'(%\d+)+', self.question)
-      var_strip = [int(var.strip('%')) for var in variables]
-      ask_string = self.question
-      # Sub out variables, one by one
-      for var in var_strip:
-        ask_string = re.sub(r'%'+str(var), str(self.data[var]), ask_string)
-      print ask_string
+      print self.render()
+
+  # Returns the question with the data substituted in for the variables.
+  # Uses p.data unless another row of data is given
+  def render(self, data=None):
+    if data is None:
+      data = self.data
+    return self.compiled_template().render(data)
+
+  # Renders this question once for each row of data. Strings are yielded
+  # lazily so any number of rows can be streamed through
+  def render_many(self, rows):
+    return self.compiled_template().render_many(rows)
+
+  # The Template for p.question, kept until the question changes so the
+  # shared cache is only consulted once per question
+  def compiled_template(self):
+    cache = self.template_cache
+    if cache is not None and cache[0] == self.question:
+      return cache[1]
+    template = compile_template(self.question)
+    self.template_cache = (self.question, template)
+    return template
   
   def poll_for_responses(self):
     guess = []
-    for i in range(len(self.answer)):
+    while len(guess) < len(self.answer_key()):
       raw = raw_input("Your Answer: ")
-      parsed = interpret(raw)
+      try:
+        parsed = AnswerInterpreter.interpret(raw)
+      except ParseError, e:
+        # Let the student try that answer again
+        print e
+        continue
       guess.append(parsed)
     return self.check(guess)
+
+
+
+# Works out the answers of every problem whose answer is a function, so
+# they are ready before anyone is checked. Problems that share an AnswerKey
+# are worked out together, a column at a time, when numpy is available
+def precompute_answers(problems):
+  groups = {}
+  for p in problems:
+    if isinstance(p.answer, AnswerKey) and numpy is not None:
+      groups.setdefault((id(p.answer), len(p.data)), []).append(p)
+    else:
+      p.answer_key()
+  for group in groups.values():
+    key = group[0].answer
+    for p, answer in zip(group, key.evaluate_rows([p.data for p in group])):
+      p.answer_cache = (key, tuple(p.data), answer)
+
+
+
+# Ways that a FrozenProblem compares a guess to its answers
+SINGLE, ORDERED, UNORDERED, CUSTOM = range(4)
+
+# A validated Problem that can't be changed. Everything validation works
+# out, the number of variables, the number of answers and how guesses are
+# compared, is worked out once when it is made, so asking and grading skip
+# validation entirely. Made with Problem.freeze.
+class FrozenProblem(Problem):
+  def __init__(self, p):
+    template = compile_template(p.question)
+    answer = p.answer_key()
+    if p.eval_function != 0:
+      strategy = CUSTOM
+    elif len(answer) == 1:
+      strategy = SINGLE
+    elif p.ordering_counts:
+      strategy = ORDERED
+    else:
+      strategy = UNORDERED
+    self.__dict__.update({
+      'question': p.question,
+      'data': tuple(p.data),
+      'answer': tuple(answer),
+      'ordering_counts': p.ordering_counts,
+      'eval_function': p.eval_function,
+      'tolerance': p.tolerance,
+      'template': template,
+      'variable_count': len(set(template.variables)),
+      'answer_length': len(answer),
+      'strategy': strategy})
+
+  def __setattr__(self, name, value):
+    raise AttributeError('A frozen problem can\'t be changed')
+
+  def __delattr__(self, name):
+    raise AttributeError('A frozen problem can\'t be changed')
+
+  # Returns an ordinary Problem with the same settings, which can be changed
+  def thaw(self):
+    p = Problem()
+    p.question = self.question
+    p.data = list(self.data)
+    p.answer = list(self.answer)
+    p.ordering_counts = self.ordering_counts
+    p.eval_function = self.eval_function
+    p.tolerance = self.tolerance
+    return p
+
+  def count_variables(self):
+    return self.variable_count
+
+  # Worked out when it was frozen
+  def answer_key(self):
+    return self.answer
+
+  # Validated when it was frozen
+  def validate_problem(self):
+    return True
+
+  def grade(self, guess):
+    if type(guess) is not list:
+      guess = [guess]
+    if len(guess) != self.answer_length:
+      return -1
+    if self.strategy == CUSTOM:
+      match = self.eval_function(guess)
+      if match != True and match != False:
+        return -1
+      return match
+    return self.default_check__(guess)
+
+  def default_check__(self, guess):
+    strategy = self.strategy
+    if strategy == SINGLE:
+      return self.test_single_answer(guess[0], self.answer[0])
+    if strategy == ORDERED:
+      for i in range(self.answer_length):
+        if not self.test_single_answer(guess[i], self.answer[i]):
+          return False
+      return True
+    return match_unordered(guess, self.answer, self.test_single_answer,
+                           self.tolerance)
+
+  def render(self, data=None):
+    if data is None:
+      data = self.data
+    return self.template.render(data)
+
+  def render_many(self, rows):
+    return self.template.render_many(rows)
@@ -0,0 +1,209 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Serves a problem set to many students at once over TCP
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import os
+import sys
+import socket
+import asyncore
+import asynchat
+import multiprocessing
+from collections import deque
+from timeit import default_timer
+from ClassGrader import init_worker, grade_submission
+
+# The protocol is one line at a time. For each problem the server sends
+#   Q <problem key> <number of answers> <question>
+# and the student replies with one answer per line. The server then sends
+# CORRECT, INCORRECT, or INVALID if an answer couldn't be read, in which
+# case the same question is asked again. After the last problem it sends
+#   DONE <score> <number of problems>
+# and hangs up.
+
+# One student working through the problem set
+class QuizSession(asynchat.async_chat):
+  def __init__(self, sock, server, session_id):
+    asynchat.async_chat.__init__(self, sock)
+    self.set_terminator('\n')
+    self.server = server
+    self.session_id = session_id
+    self.incoming = []
+    self.index = 0
+    self.responses = []
+    self.score = 0
+    self.waiting = False # Set while an answer is being graded
+    self.ask()
+
+  def ask(self):
+    key = self.server.order[self.index]
+    p = self.server.problems[key]
+    self.push('Q %s %d %s\n' % (key, len(p.answer), p.render()))
+
+  def collect_incoming_data(self, data):
+    self.incoming.append(data)
+
+  def found_terminator(self):
+    line = ''.join(self.incoming).strip()
+    self.incoming = []
+    if self.waiting:
+      self.push('BUSY\n')
+      return
+    self.responses.append(line)
+    key = self.server.order[self.index]
+    if len(self.responses) == len(self.server.problems[key].answer):
+      self.waiting = True
+      self.submitted = (self.responses, default_timer())
+      self.server.grade(self, key, self.responses)
+      self.responses = []
+
+  # Called by the server once the last answer has been graded
+  def graded(self, result):
+    self.waiting = False
+    if self.server.log is not None:
+      responses, start = self.submitted
+      self.server.log.record('session-%d' % self.session_id, self.server.order[self.index],
+                             responses, None, result, default_timer() - start)
+    if result == -1:
+      self.push('INVALID\n')
+      self.ask()
+      return
+    self.push('CORRECT\n' if result else 'INCORRECT\n')
+    self.score += bool(result)
+    self.index += 1
+    if self.index < len(self.server.order):
+      self.ask()
+    else:
+      self.push('DONE %d %d\n' % (self.score, len(self.server.order)))
+      self.close_when_done()
+
+  def handle_close(self):
+    self.server.sessions.pop(self.session_id, None)
+    self.close()
+
+# Reads the wake up bytes written when graded answers are ready
+class Waker(asyncore.file_dispatcher):
+  def __init__(self, fd, server):
+    asyncore.file_dispatcher.__init__(self, fd)
+    self.server = server
+
+  def writable(self):
+    return False
+
+  def handle_read(self):
+    self.recv(4096)
+    self.server.deliver()
+
+# Accepts students and hands their answers to a pool of worker processes,
+# so that parsing never holds up the event loop. With processes=0 answers
+# are graded in the event loop itself. Every attempt is recorded in log, an
+# AttemptLog, if one is given. With a cache_size, each grader remembers that
+# many results, so an answer many students give is only graded once
+class QuizServer(asyncore.dispatcher):
+  def __init__(self, problems, host='127.0.0.1', port=8765, processes=None, log=None,
+               cache_size=0):
+    asyncore.dispatcher.__init__(self)
+    self.log = log
+    self.problems = {}
+    for key in problems:
+      self.problems[key] = problems[key].freeze()
+      if self.problems[key] == -1:
+        raise ValueError('Problem ' + str(key) + ' is not valid')
+    self.order = sorted(problems)
+    self.sessions = {}
+    self.next_id = 0
+
+    self.pool = None
+    if processes == 0:
+      init_worker(self.problems, cache_size)
+    else:
+      self.pool = multiprocessing.Pool(processes, init_worker,
+                                       (self.problems, cache_size))
+      # Graded answers come back on a pool thread. They wait here until
+      # the event loop is woken up through the pipe to deliver them
+      self.ready = deque()
+      read_fd, self.wake_fd = os.pipe()
+      self.waker = Waker(read_fd, self)
+
+    self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.set_reuse_addr()
+    self.bind((host, port))
+    self.listen(1024)
+
+  def handle_accept(self):
+    pair = self.accept()
+    if pair is None:
+      return
+    self.next_id += 1
+    self.sessions[self.next_id] = QuizSession(pair[0], self, self.next_id)
+
+  def grade(self, session, key, responses):
+    submission = (session.session_id, key, responses)
+    if self.pool is None:
+      session.graded(grade_submission(submission)[2])
+    else:
+      self.pool.apply_async(grade_submission, (submission,),
+                            callback=self.finished)
+
+  # Runs on a pool thread, so it only queues the result
+  def finished(self, result):
+    self.ready.append(result)
+    os.write(self.wake_fd, 'x')
+
+  def deliver(self):
+    while self.ready:
+      session_id, key, result = self.ready.popleft()
+      session = self.sessions.get(session_id)
+      if session is not None: # The student may have hung up
+        session.graded(result)
+
+  def serve_forever(self):
+    try:
+      asyncore.loop(use_poll=True)
+    finally:
+      if self.log is not None:
+        self.log.close()
+      if self.pool is not None:
+        self.pool.terminate()
+
+
+
+def main():
+  from sample_problem_set import prepareHW
+  port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+  log = None
+  if len(sys.argv) > 2:
+    from AttemptLog import AttemptLog
+    log = AttemptLog(sys.argv[2])
+  server = QuizServer(prepareHW(), port=port, log=log)
+  print 'Serving on port', port
+  server.serve_forever()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,239 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Writes personalized worksheets and their answer keys to files
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import os
+import re
+import cgi
+import sys
+import hashlib
+import itertools
+import multiprocessing
+from ProblemSet import compile_template
+from ClassGrader import windowed_imap
+from AnswerMatcher import AnswerSet
+
+# Characters LaTeX gives a meaning to, and how to write them as text
+LATEX_ESCAPES = {'\\': r'\textbackslash{}', '&': r'\&', '%': r'\%', '$': r'\$',
+                 '#': r'\#', '_': r'\_', '{': r'\{', '}': r'\}',
+                 '~': r'\textasciitilde{}', '^': r'\^{}'}
+LATEX_SPECIAL = re.compile(r'[\\&%$#_{}~^]')
+
+def latex_escape(text):
+  return LATEX_SPECIAL.sub(lambda m: LATEX_ESCAPES[m.group()], text)
+
+def html_escape(text):
+  return cgi.escape(text, True)
+
+# Each format turns a title, a student and a list of lines (questions or
+# answers) into the text of one file
+
+class TextFormat:
+  extension = '.txt'
+
+  def document(self, title, student, lines):
+    pieces = [title, '\n', 'Student: ', student, '\n\n']
+    for number, line in enumerate(lines, 1):
+      pieces.extend([str(number), '. ', line, '\n\n'])
+    return ''.join(pieces)
+
+class LatexFormat:
+  extension = '.tex'
+
+  def document(self, title, student, lines):
+    pieces = ['\\documentclass{article}\n\\begin{document}\n\\section*{',
+              latex_escape(title), '}\nStudent: ', latex_escape(student),
+              '\n\\begin{enumerate}\n']
+    for line in lines:
+      pieces.extend(['\\item ', latex_escape(line), '\n'])
+    pieces.append('\\end{enumerate}\n\\end{document}\n')
+    return ''.join(pieces)
+
+class HtmlFormat:
+  extension = '.html'
+
+  def document(self, title, student, lines):
+    pieces = ['<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>',
+              html_escape(title), ' - ', html_escape(student), '</title></head>\n<body>\n<h1>',
+              html_escape(title), '</h1>\n<p>Student: ', html_escape(student), '</p>\n<ol>\n']
+    for line in lines:
+      pieces.extend(['<li>', html_escape(line), '</li>\n'])
+    pieces.append('</ol>\n</body></html>\n')
+    return ''.join(pieces)
+
+FORMATS = {'text': TextFormat(), 'latex': LatexFormat(), 'html': HtmlFormat()}
+
+
+
+# Writes a single answer the way a student would type it
+def format_answer(value):
+  if type(value) is complex:
+    if value.imag == 0:
+      return '%.6g' % value.real
+    return '%.6g%+.6gj' % (value.real, value.imag)
+  if type(value) is float:
+    return '%.6g' % value
+  if isinstance(value, AnswerSet):
+    return ' or '.join(format_answer(a) for a in value)
+  return str(value)
+
+# The line of the answer key for one problem
+def format_answers(p):
+  answer = p.answer_key()
+  line = ', '.join(format_answer(a) for a in answer)
+  if len(answer) > 1 and not p.ordering_counts:
+    line += ' (in any order)'
+  return line
+
+# Names made only of these are used as they are for file names
+PLAIN_NAME = re.compile(r'[A-Za-z0-9_][A-Za-z0-9_.]*\Z')
+
+# A student's name as a str, with unicode encoded as UTF-8
+def name_text(student):
+  if isinstance(student, unicode):
+    return student.encode('utf-8')
+  return str(student)
+
+# A file name for a student that no other student can share. Plain names
+# are used as they are. Anything else has its other characters replaced
+# and a digest of the whole name added after a ~, so 'Ann Lee' and
+# 'Ann_Lee' get different files. Plain names never hold a - or a ~, so
+# they can't clash with a changed name or with an answer key's -key
+def file_name(student):
+  name = name_text(student)
+  if PLAIN_NAME.match(name):
+    return name
+  digest = hashlib.md5(name).hexdigest()[:10]
+  return re.sub(r'[^A-Za-z0-9_.]', '_', name).lstrip('.')[:100] + '~' + digest
+
+# Writes one student's worksheet and answer key into directory, as
+# <student><extension> and <student>-key<extension>
+def write_worksheet(directory, format, title, student, problems):
+  student = name_text(student)
+  questions = [compile_template(p.question).render(p.data) for p in problems]
+  answers = [format_answers(p) for p in problems]
+  base = os.path.join(directory, file_name(student))
+  with open(base + format.extension, 'w') as f:
+    f.write(format.document(title, student, questions))
+  with open(base + '-key' + format.extension, 'w') as f:
+    f.write(format.document(title + ' - Answer key', student, answers))
+
+# Writes a list of worksheets, in a worker process.
+# Return: How many were written
+def write_chunk(task):
+  directory, format_name, title, chunk = task
+  format = FORMATS[format_name]
+  for student, problems in chunk:
+    write_worksheet(directory, format, title, student, problems)
+  return len(chunk)
+
+# Writes a worksheet and an answer key for every (student, problems) in
+# worksheets, where problems is the list of Problems that student gets,
+# each with its own data. format is 'text', 'latex' or 'html'. Worksheets
+# are read lazily and written one file at a time, so any number can be
+# streamed through. With more than one process, chunks of chunksize
+# worksheets are handed to a pool, with at most two windows of window
+# chunks read ahead. processes=None means one per core.
+# Return: The number of worksheets written, or -1 for an unknown format
+def write_worksheets(worksheets, directory, format='text', title='Problem Set',
+                     processes=1, chunksize=100, window=20):
+  if format not in FORMATS:
+    print 'Unknown format ' + str(format) + '. Use one of ' + ', '.join(sorted(FORMATS))
+    return -1
+  if not os.path.isdir(directory):
+    os.makedirs(directory)
+
+  worksheets = iter(worksheets)
+  chunks = iter(lambda: list(itertools.islice(worksheets, chunksize)), [])
+  tasks = ((directory, format, title, chunk) for chunk in chunks)
+  if processes == 1:
+    return sum(write_chunk(task) for task in tasks)
+
+  pool = multiprocessing.Pool(processes)
+  try:
+    written = sum(windowed_imap(pool, write_chunk, tasks, window, ordered=False))
+    pool.close()
+  finally:
+    pool.terminate()
+    pool.join()
+  return written
+
+# Pairs each student with one problem from each ProblemGenerator, so every
+# student gets different data. Each generator gets seeds of its own, and
+# one that runs out of new variants starts over with its next seed.
+# Yields: (student, list of Problems)
+def worksheets_from_generators(students, generators, seed=0):
+  streams = [endless(g, seed + i, len(generators)) for i, g in enumerate(generators)]
+  for student in students:
+    yield student, [next(s) for s in streams]
+
+def endless(generator, seed, step):
+  while True:
+    made = 0
+    for p in generator.generate(None, seed):
+      made += 1
+      yield p
+    if made == 0:
+      return
+    seed += step
+
+
+
+def main():
+  import numpy
+  from ProblemGenerator import ProblemGenerator
+  if len(sys.argv) < 3:
+    print 'Usage: python Worksheets.py <directory> <number of students> [text|latex|html]'
+    return
+  directory = sys.argv[1]
+  count = int(sys.argv[2])
+  format = sys.argv[3] if len(sys.argv) > 3 else 'text'
+  def quadratics(rand, size):
+    return numpy.column_stack([rand.randint(1, 11, size),
+                               rand.randint(-10, 11, size),
+                               rand.randint(-10, 11, size)])
+  def complex_numbers(rand, size):
+    return rand.randint(-10, 11, (size, 1)) + 1j * rand.randint(-10, 11, (size, 1))
+  generators = [ProblemGenerator("What are the roots of %0x^2 + %1x + %2?", quadratics,
+                                 ['(-%1 + sqrt(%1^2 - 4%0%2)) / (2%0)',
+                                  '(-%1 - sqrt(%1^2 - 4%0%2)) / (2%0)']),
+                ProblemGenerator("What is the modulus (magnitude) of %0?", complex_numbers,
+                                 ['abs(%0)'], accept=lambda data: data[0] != 0),
+                ProblemGenerator("What is the reciprocal in polar form of %0? "
+                                 "(Enter the magnitude then the phase)", complex_numbers,
+                                 ['abs(1/%0)', 'phase(1/%0)'], ordering_counts=True,
+                                 accept=lambda data: data[0] != 0)]
+  students = ['student%d' % i for i in range(count)]
+  written = write_worksheets(worksheets_from_generators(students, generators),
+                             directory, format, processes=None)
+  print 'Wrote', written, 'worksheets to', directory
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,786 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Timing scripts for the problem set framework
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import re
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import types
+import resource
+import traceback
+from random import Random
+
+from ProblemSet import *
+import AnswerInterpreter
+from AnswerInterpreter import interpret
+
+# Everything measured in this run, by name
+results = {}
+
+# Runs func over and over and reports the cost of one call. Each call should
+# perform n operations
+def report(name, func, n, repeat=3):
+  best = None
+  for i in range(repeat):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  print '%-40s %10.2f us/op %12.0f ops/sec' % (name, 1e6*best/n, n/best)
+  results[name] = {'ops_per_sec': n/best}
+  return best
+
+# Peak memory of this process so far, in kilobytes
+def peak_memory():
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+
+# Renders a question the way Problem.ask used to, with one re.sub per variable
+def render_with_re_sub(question, data):
+  variables = re.findall(r'(%\d+)+', question)
+  var_strip = [int(var.strip('%')) for var in variables]
+  ask_string = question
+  for var in var_strip:
+    ask_string = re.sub(r'%'+str(var), str(data[var]), ask_string)
+  return ask_string
+
+def bench_render(n=20000):
+  rand = Random(0)
+  p = Problem()
+  p.question = "What are the roots of %0x^2 + %1x + %2? Give the smaller root %0 first."
+  rows = [[rand.randint(1, 10), rand.randint(-10, 10), complex(0, rand.randint(-5, 5))]
+          for i in range(n)]
+
+  report('render: re.sub per variable',
+         lambda: [render_with_re_sub(p.question, row) for row in rows], n)
+  report('render: Problem.render', lambda: [p.render(row) for row in rows], n)
+  report('render: Problem.render_many', lambda: list(p.render_many(rows)), n)
+
+
+def bench_grade(n=20000):
+  rand = Random(0)
+  p = Problem()
+  p.question = "What are the roots of %0x^2 + %1x + %2?"
+  p.data = [1, 2, 5]
+  p.answer = [complex(-1, 2), complex(-1, -2)]
+  guesses = [[complex(-1, rand.choice([2, -2])), complex(-1, rand.choice([2, -2.5]))]
+             for i in range(n)]
+
+  for ordering_counts in [True, False]:
+    p.ordering_counts = ordering_counts
+    suffix = ' (ordered)' if ordering_counts else ' (unordered)'
+    report('grade: default_check__' + suffix,
+           lambda: [p.default_check__(g) for g in guesses], n)
+    report('grade: check_batch' + suffix, lambda: p.check_batch(guesses), n)
+
+  # check validates the problem before every guess, a frozen problem doesn't
+  p.ordering_counts = False
+  frozen = p.freeze()
+  report('grade: validate_problem + grade',
+         lambda: [p.validate_problem() and p.grade(g) for g in guesses], n)
+  report('grade: FrozenProblem.grade', lambda: [frozen.grade(g) for g in guesses], n)
+
+
+# Matches unordered answers the way default_check__ used to: copy both
+# lists, then scan and delete greedily
+def greedy_unordered_check(p, guess):
+  ans_copy = copy.deepcopy(p.answer)
+  guess_copy = copy.deepcopy(guess)
+  while len(ans_copy) > 0:
+    match = False
+    for i in range(len(guess_copy)):
+      if p.test_single_answer(guess_copy[i], ans_copy[0]):
+        del ans_copy[0]
+        del guess_copy[i]
+        match = True
+        break
+    if not match:
+      return False
+  return True
+
+def bench_unordered(sizes=(10, 100, 1000)):
+  rand = Random(0)
+  for k in sizes:
+    p = Problem()
+    p.ordering_counts = False
+    # Roots of a degree k polynomial with random coefficients, roughly
+    p.answer = [complex(rand.uniform(-10, 10), rand.uniform(-10, 10)) for i in range(k)]
+    guess = list(p.answer)
+    rand.shuffle(guess)
+    n = max(1, 1000 // k)
+    report('unordered: greedy deepcopy k=%d' % k,
+           lambda: [greedy_unordered_check(p, guess) for i in range(n)], n, repeat=1)
+    report('unordered: match_unordered k=%d' % k,
+           lambda: [p.default_check__(guess) for i in range(n)], n)
+
+
+# One right answer for each slot of a problem, taking the first answer of
+# any slot that accepts many
+def right_answers(p):
+  from AnswerMatcher import AnswerSet
+  return [list(a)[0] if isinstance(a, AnswerSet) else a for a in p.answer_key()]
+
+# Answers of the sort students type in, with and without imaginary parts
+def answer_corpus(n, seed=0):
+  rand = Random(seed)
+  def number():
+    return rand.choice([str(rand.randint(-20, 20)),
+                        '%.3f' % rand.uniform(-10, 10),
+                        str(rand.randint(1, 9)) + '/' + str(rand.randint(1, 9))])
+  forms = [lambda: number(),
+           lambda: number() + rand.choice(['+', '-', ' + ', ' - ']) + number().lstrip('-') + 'j',
+           lambda: number() + 'j',
+           lambda: '-j',
+           lambda: number() + '*' + number().lstrip('-') + ' - ' + 'j' + str(rand.randint(1, 9)),
+           lambda: number() + ' + ' + number().lstrip('-') + ' + ' + number().lstrip('-') + 'i']
+  return [rand.choice(forms)() for i in range(n)]
+
+# Long answers with parentheses and many terms, like a student expanding
+# a product by hand
+def long_expression_corpus(n, seed=0):
+  rand = Random(seed)
+  def term():
+    coefficient = '%.2f' % rand.uniform(0.1, 10)
+    return rand.choice([coefficient, coefficient + 'j', 'j' + coefficient,
+                        '(' + coefficient + ' - ' + str(rand.randint(1, 9)) + 'j)'])
+  def expression():
+    parts = [term()]
+    for i in range(rand.randint(6, 12)):
+      parts.append(rand.choice([' + ', ' - ', '*', '/']))
+      parts.append(term())
+    return ''.join(parts)
+  return [expression() for i in range(n)]
+
+def bench_interpret(n=20000):
+  corpus = answer_corpus(n)
+  report('interpret: mixed student answers', lambda: [interpret(q) for q in corpus], n)
+  long_corpus = long_expression_corpus(n // 4)
+  report('interpret: long complex expressions',
+         lambda: [interpret(q) for q in long_corpus], n // 4)
+
+  # A class tends to submit the same few answers over and over
+  rand = Random(1)
+  pool = answer_corpus(500, seed=1) + ['-1', '1+j', '0.5-0.866j'] * 100
+  repeated = [rand.choice(pool) for i in range(n)]
+  report('interpret: repeated answers', lambda: [interpret(q) for q in repeated], n)
+  cache = AnswerInterpreter.enable_parse_cache(1024)
+  report('interpret: repeated answers, cached',
+         lambda: [interpret(q) for q in repeated], n)
+  stats = cache.stats()
+  AnswerInterpreter.disable_parse_cache()
+  print '  cache: %(hits)d hits, %(misses)d misses, %(evictions)d evictions' % stats
+
+  report('interpret: interpret_array', lambda: AnswerInterpreter.interpret_array(corpus), n)
+  # Most answers are written as plain numbers
+  literals = ['%.3f%+.3fj' % (rand.uniform(-5, 5), rand.uniform(-5, 5))
+              if rand.random() < 0.5 else str(rand.randint(-20, 20)) for i in range(n)]
+  report('interpret: plain numbers, interpret', lambda: [interpret(q) for q in literals], n)
+  report('interpret: plain numbers, interpret_array',
+         lambda: AnswerInterpreter.interpret_array(literals), n)
+
+
+# Parses and grades the same answers with the stage timers off, then on
+def bench_profile(n=20000):
+  import Instrumentation
+  p = Problem()
+  p.question = "What are the roots of %0x^2 + %1x + %2?"
+  p.data = [1, 2, 5]
+  p.answer = [complex(-1, 2), complex(-1, -2)]
+  frozen = p.freeze()
+  rand = Random(0)
+  corpus = [[rand.choice(['-1+2j', '-1-2j', '-1+2.5j', '-(1+2j)']) for k in range(2)]
+            for i in range(n)]
+  run = lambda: [frozen.grade([interpret(q) for q in guess]) for guess in corpus]
+  report('profile: interpret + grade, timers off', run, n)
+  Instrumentation.enable()
+  report('profile: interpret + grade, timers on', run, n)
+  Instrumentation.disable()
+  for name, stage in sorted(Instrumentation.stats()['stages'].items()):
+    print '  %-36s %9d calls %8.2f us/call' % (name, stage['calls'], stage['mean_us'])
+  Instrumentation.reset()
+
+
+# Grades expression answers against a compiled key, first evaluating each
+# guess at all the sample points in one numpy pass, then one point at a time
+def bench_expression(n=5000):
+  import AnswerExpression
+  from AnswerExpression import compile_expression, equivalent, sample_points
+  key = compile_expression('(x-1)(x+2)(2y+1)')
+  rand = Random(0)
+  forms = ['(x^2+x-2)(2y+1)', '2x^2y + x^2 + 2xy + x - 4y - 2',
+           '(x-1)(x+2)(2y-1)', '(2y+1)(x+2)(x-1)', '(x-1)^2(2y+1)']
+  guesses = [rand.choice(forms) for i in range(n)]
+  report('expression: compile guess', lambda: [compile_expression(g) for g in guesses], n)
+  report('expression: equivalent, vectorized',
+         lambda: [equivalent(g, key, 0.001) for g in guesses], n)
+  p = Problem()
+  p.question = 'Expand %0'
+  p.data = ['(x-1)(x+2)(2y+1)']
+  p.answer = [key]
+  report('expression: check_batch', lambda: p.check_batch([[g] for g in guesses]), n)
+
+  points = sample_points(('x', 'y'))
+  def pointwise(g):
+    guess = compile_expression(g)
+    for k in range(AnswerExpression.SAMPLE_COUNT):
+      point = {'x': complex(points['x'][k]), 'y': complex(points['y'][k])}
+      if abs(guess.evaluate(point) - key.evaluate(point)) > 0.001 * abs(key.evaluate(point)):
+        return False
+    return True
+  report('expression: equivalent, point by point', lambda: [pointwise(g) for g in guesses], n)
+
+
+# Grades guesses against a slot that accepts many answers, through the
+# AnswerSet index, through check_batch and by testing every accepted
+# answer in turn
+def bench_accepted(sizes=(10, 1000, 100000), n=2000):
+  from AnswerMatcher import AnswerSet
+  p = Problem()
+  p.question = 'Name a point of the set %0'
+  p.data = ['S']
+  rand = Random(0)
+  for size in sizes:
+    accepted = [complex(rand.uniform(-50, 50), rand.uniform(-50, 50)) for i in range(size)]
+    answers = AnswerSet(accepted)
+    guesses = [rand.choice(accepted) * (1 + rand.uniform(-0.002, 0.002)) for i in range(n)]
+    label = ' (%d accepted)' % size
+    report('accepted: AnswerSet' + label,
+           lambda: [p.test_single_answer(g, answers) for g in guesses], n)
+    p.answer = [answers]
+    rows = [[g] for g in guesses]
+    report('accepted: check_batch' + label, lambda: p.check_batch(rows), n)
+    count = n if size <= 1000 else n // 20
+    report('accepted: linear scan' + label,
+           lambda: [any(p.test_single_answer(g, a) for a in accepted)
+                    for g in guesses[:count]], count)
+
+
+# Records attempts from a large class in an AttemptLog, then times the
+# queries a teacher would run against it
+def bench_log(n=200000, students=2000, problems=200):
+  import os
+  import shutil
+  import tempfile
+  from AttemptLog import AttemptLog
+  rand = Random(0)
+  attempts = [('student%d' % rand.randrange(students), 'problem%d' % rand.randrange(problems),
+               ['%d+%dj' % (rand.randint(-9, 9), rand.randint(-9, 9))],
+               rand.random() < 0.6, rand.uniform(1e-5, 1e-4)) for i in range(n)]
+  directory = tempfile.mkdtemp()
+  log = AttemptLog(os.path.join(directory, 'attempts.db'))
+  def record():
+    for student, problem, raw, correct, latency in attempts:
+      log.record(student, problem, raw, None, correct, latency)
+    log.flush()
+  report('log: record', record, n, repeat=1)
+  report('log: problem_stats, every problem', lambda: log.problem_stats(), 1)
+  report('log: problem_stats, one problem', lambda: log.problem_stats('problem7'), 1)
+  report('log: hardest 10 problems', lambda: log.hardest(10), 1)
+  report('log: history of one student', lambda: log.history('student7'), 1)
+  report('log: last 10 attempts of one student', lambda: log.history('student7', 10), 1)
+  log.close()
+  shutil.rmtree(directory)
+
+
+# Writes worksheets and answer keys for a class, first by capturing what
+# ask prints, then with Worksheets in one process and in a pool. Writing
+# the same bytes straight to disk shows how much of the time is I/O
+def bench_worksheets(students=2000):
+  import os
+  import shutil
+  import tempfile
+  import StringIO
+  import numpy
+  from ProblemGenerator import ProblemGenerator
+  from Worksheets import write_worksheets, worksheets_from_generators
+  quadratics = lambda rand, size: numpy.column_stack([rand.randint(1, 11, size),
+                                                      rand.randint(-10, 11, (size, 2))])
+  numbers = lambda rand, size: rand.randint(-10, 11, (size, 1)) + 1j*rand.randint(1, 11, (size, 1))
+  generators = [ProblemGenerator("What are the roots of %0x^2 + %1x + %2?", quadratics,
+                                 ['(-%1 + sqrt(%1^2 - 4%0%2)) / (2%0)',
+                                  '(-%1 - sqrt(%1^2 - 4%0%2)) / (2%0)']),
+                ProblemGenerator("What is the modulus (magnitude) of %0?", numbers, ['abs(%0)']),
+                ProblemGenerator("What is the phase of %0?", numbers, ['phase(%0)'])]
+  worksheets = list(worksheets_from_generators(['student%d' % i for i in range(students)],
+                                               generators))
+  directory = tempfile.mkdtemp()
+
+  def capture():
+    stdout = sys.stdout
+    for student, problems in worksheets:
+      sys.stdout = StringIO.StringIO()
+      try:
+        for p in problems:
+          p.ask()
+        sheet = sys.stdout.getvalue()
+      finally:
+        sys.stdout = stdout
+      with open(os.path.join(directory, student + '.txt'), 'w') as f:
+        f.write(sheet)
+      with open(os.path.join(directory, student + '-key.txt'), 'w') as f:
+        f.write('\n'.join(repr(p.answer_key()) for p in problems))
+  report('worksheets: capture ask output', capture, students, repeat=1)
+  for format in ['text', 'latex', 'html']:
+    report('worksheets: write_worksheets %s' % format,
+           lambda: write_worksheets(worksheets, directory, format), students, repeat=1)
+  report('worksheets: write_worksheets text, pool',
+         lambda: write_worksheets(worksheets, directory, 'text', processes=None),
+         students, repeat=1)
+  contents = [(os.path.join(directory, student), open(os.path.join(directory, student + '.txt')).read(),
+               open(os.path.join(directory, student + '-key.txt')).read())
+              for student, problems in worksheets]
+  def write_only():
+    for base, sheet, key in contents:
+      with open(base + '.txt', 'w') as f:
+        f.write(sheet)
+      with open(base + '-key.txt', 'w') as f:
+        f.write(key)
+  report('worksheets: writing the files alone', write_only, students, repeat=1)
+  shutil.rmtree(directory)
+
+
+# Builds the sample problem set, and a large bank of problems made from a
+# few templates, then renders every question in the bank
+def bench_construct(n=20000):
+  import random
+  import sample_problem_set
+  random.seed(0) # prepareHW draws its data from the random module
+  report('construct: prepareHW', lambda: [sample_problem_set.prepareHW() for i in range(50)], 50)
+
+  rand = Random(0)
+  templates = ["What are the roots of %0x^2 + %1x + %2?",
+               "What is the modulus (magnitude) of %0?",
+               "If Bill has %0 apples that are valued at %1 cents apiece, "
+               "how much are %2 of them worth?"]
+  rows = [[rand.randint(1, 10), rand.randint(-10, 10), rand.randint(1, 10)]
+          for i in range(n)]
+  counts = [len(set(compile_template(t).variables)) for t in templates]
+  def build():
+    bank = []
+    for i in range(n):
+      p = Problem()
+      p.question = templates[i % len(templates)]
+      p.data = rows[i][:counts[i % len(templates)]]
+      p.answer = [sum(p.data)]
+      bank.append(p)
+    return bank
+  report('construct: templated bank', build, n)
+  bank = build()
+  report('construct: render templated bank', lambda: [p.render() for p in bank], n)
+
+  from ProblemGenerator import ProblemGenerator
+  generator = ProblemGenerator(templates[0],
+                               lambda rand, size: rand.randint(1, 1000, (size, 3)),
+                               lambda data: [-data[1] / (2.0*data[0])])
+  def generate():
+    for p in generator.generate(n, seed=0):
+      pass
+  report('construct: ProblemGenerator (streamed)', generate, n)
+
+  # The roots of a quadratic worked out in Python for every row, then from
+  # compiled answer keys, one row at a time and a column at a time
+  import cmath
+  from AnswerExpression import compile_answer
+  def roots(data):
+    a, b, c = data
+    d = cmath.sqrt(b*b - 4*a*c)
+    return [(-b + d)/(2*a), (-b - d)/(2*a)]
+  keys = [compile_answer('(-%1 + sqrt(%1^2 - 4%0%2)) / (2%0)'),
+          compile_answer('(-%1 - sqrt(%1^2 - 4%0%2)) / (2%0)')]
+  report('construct: answer keys, Python function', lambda: [roots(d) for d in rows], n)
+  report('construct: answer keys, compile_answer per row',
+         lambda: [[key(d) for key in keys] for d in rows], n)
+  report('construct: answer keys, compile_answer evaluate_rows',
+         lambda: [key.evaluate_rows(rows) for key in keys], n)
+  sampler = lambda rand, size: rand.randint(1, 1000, (size, 3))
+  generator = ProblemGenerator(templates[0], sampler, roots)
+  report('construct: ProblemGenerator, Python answer keys',
+         lambda: list(generator.generate(n, seed=0)), n)
+  generator = ProblemGenerator(templates[0], sampler, [str(key) for key in keys])
+  report('construct: ProblemGenerator, compiled answer keys',
+         lambda: list(generator.generate(n, seed=0)), n)
+
+  # The same bank with the keys left to be worked out later, once all the
+  # problems are built
+  from ProblemSet import precompute_answers
+  for answer in (roots, [str(key) for key in keys]):
+    generator = ProblemGenerator(templates[0], sampler, answer, lazy=True)
+    kind = 'compiled' if type(answer) is list else 'Python'
+    report('construct: ProblemGenerator, lazy %s answer keys' % kind,
+           lambda: list(generator.generate(n, seed=0)), n)
+    bank = list(generator.generate(n, seed=0))
+    report('construct: precompute_answers, %s answer keys' % kind,
+           lambda: precompute_answers(bank), n, repeat=1)
+
+
+# Grades a class without and with a GradeCache. Like real class data, most
+# students give one of a few answers to each problem: the right one
+# written a couple of ways, or one of the usual mistakes
+def bench_cache(students=5000):
+  import random
+  import sample_problem_set
+  from ClassGrader import grade_submissions, cache_stats
+  random.seed(0)
+  problems = sample_problem_set.prepareHW()
+  rand = Random(0)
+  common = {}
+  for key in problems:
+    answers = right_answers(problems[key])
+    right = [repr(a).strip('()') for a in answers]
+    rounded = ['%.3g' % a if type(a) is float else repr(a).strip('()') for a in answers]
+    wrong = [repr(-a).strip('()') for a in answers]
+    common[key] = [right, right[::-1], rounded, wrong, ['0'] * len(answers)]
+  submissions = []
+  for student in range(students):
+    for key in sorted(problems):
+      submissions.append((student, key, rand.choice(common[key])))
+  n = len(submissions)
+  report('cache: grade_submissions',
+         lambda: list(grade_submissions(problems, submissions, 1)), n)
+  report('cache: grade_submissions, GradeCache',
+         lambda: list(grade_submissions(problems, submissions, 1, cache_size=10000)), n)
+  stats = cache_stats()
+  print '  %.1f%% hit rate, %.2f seconds of grading saved' % (
+    100*stats['hit_rate'], stats['saved_seconds'])
+
+
+# Grades a whole class with one process, then with one per core
+def bench_parallel(students=5000):
+  import random
+  import multiprocessing
+  import sample_problem_set
+  from ClassGrader import grade_submissions
+  random.seed(0)
+  problems = sample_problem_set.prepareHW()
+  rand = Random(0)
+  submissions = []
+  for student in range(students):
+    for key in sorted(problems):
+      responses = [repr(a) if rand.random() < 0.5 else str(rand.randint(-3, 3))
+                   for a in right_answers(problems[key])]
+      submissions.append((student, key, [r.strip('()') for r in responses]))
+  n = len(submissions)
+  for processes in sorted(set([1, multiprocessing.cpu_count()])):
+    report('parallel: grade_submissions, %d processes' % processes,
+           lambda: list(grade_submissions(problems, submissions, processes)), n, repeat=1)
+
+
+# Streams submission files of two sizes through grade_file. Peak memory
+# should barely move between them
+def bench_stream(sizes=(20000, 200000)):
+  import os
+  import random
+  import tempfile
+  import sample_problem_set
+  from ClassGrader import grade_file
+  random.seed(0)
+  problems = sample_problem_set.prepareHW()
+  keys = sorted(problems)
+  rand = Random(0)
+  directory = tempfile.mkdtemp()
+  for n in sizes:
+    in_path = os.path.join(directory, 'submissions.jsonl')
+    out_path = os.path.join(directory, 'results.jsonl')
+    with open(in_path, 'w') as f:
+      for i in range(n):
+        key = keys[i % len(keys)]
+        responses = [repr(a).strip('()') for a in right_answers(problems[key])]
+        f.write(json.dumps({'student': i // len(keys), 'problem': key,
+                            'responses': responses}) + '\n')
+    before = peak_memory()
+    report('stream: grade_file, %d rows' % n,
+           lambda: grade_file(problems, in_path, out_path, processes=1,
+                              report_every=n + 1), n, repeat=1)
+    print '  peak memory growth: %d KB' % (peak_memory() - before)
+    os.remove(in_path)
+    os.remove(out_path)
+  os.rmdir(directory)
+
+
+# Writes a bank file, then times opening it and reading problems at random
+def bench_bank(n=200000):
+  import os
+  import tempfile
+  from ProblemGenerator import ProblemGenerator
+  from BankFile import write_bank, MappedBank
+  generator = ProblemGenerator("What are the roots of %0x^2 + %1x + %2?",
+                               lambda rand, size: rand.randint(1, 1000, (size, 3)),
+                               lambda data: [-data[1] / (2.0*data[0])])
+  handle, path = tempfile.mkstemp(suffix='.bank')
+  os.close(handle)
+  report('bank: write_bank', lambda: write_bank(path, generator.generate(n)), n, repeat=1)
+  print '  %.1f bytes per problem' % (os.path.getsize(path) / float(n))
+  report('bank: open', lambda: MappedBank(path).close(), 1)
+  bank = MappedBank(path)
+  rand = Random(0)
+  picks = [rand.randrange(n) for i in range(20000)]
+  report('bank: random problem', lambda: [bank[i] for i in picks], len(picks))
+  bank.close()
+  os.remove(path)
+
+  # The same problems held in memory, as objects and as columns
+  from ProblemBank import ProblemBank, object_memory_per_problem
+  problems = list(generator.generate(n))
+  report('bank: ProblemBank', lambda: ProblemBank(problems), n, repeat=1)
+  def append_each():
+    bank = ProblemBank()
+    for p in problems:
+      bank.append(p)
+  report('bank: ProblemBank.append', append_each, n, repeat=1)
+  columns = ProblemBank(problems)
+  columns.compact()
+  print '  %.1f bytes per problem as Problem objects, %.1f in a ProblemBank' % (
+    object_memory_per_problem(problems), columns.memory_per_problem())
+  report('bank: ProblemBank random problem', lambda: [columns[i] for i in picks], len(picks))
+  guesses = [list(problems[i].answer) for i in picks]
+  report('bank: grade Problem',
+         lambda: [problems[i].grade(g) for i, g in zip(picks, guesses)], len(picks))
+  report('bank: grade ProblemBank view',
+         lambda: [columns[i].grade(g) for i, g in zip(picks, guesses)], len(picks))
+
+
+# Picks and records problems for many students at once from banks of
+# growing size. The cost of a pick should grow with the log of the bank
+# size, where scanning a topic for the nearest difficulty grows with the
+# bank itself
+def bench_select(sizes=(1000, 10000, 100000, 1000000), students=2000, picks=20000):
+  import numpy
+  from ProblemSelector import ProblemSelector
+  rand = numpy.random.RandomState(0)
+  topics = ['topic%d' % t for t in range(20)]
+  for size in sizes:
+    topic_of = rand.randint(0, len(topics), size)
+    difficulties = rand.normal(0, 1.5, size)
+    names = numpy.array(topics)[topic_of]
+    report('select: build index, %d problems' % size,
+           lambda: ProblemSelector(names, difficulties), size, repeat=1)
+    selector = ProblemSelector(names, difficulties)
+    who = rand.randint(0, students, picks).tolist()
+    luck = rand.random_sample(picks).tolist()
+    def pick():
+      for student, roll in zip(who, luck):
+        problem = selector.next_problem(student)
+        selector.record(student, problem, roll < 0.7)
+    report('select: next_problem + record, %d problems' % size, pick, picks, repeat=1)
+
+    def scan(count=200):
+      for student in who[:count]:
+        topic = rand.randint(0, len(topics))
+        candidates = numpy.flatnonzero(topic_of == topic)
+        candidates[numpy.argmin(numpy.abs(difficulties[candidates] - 0.85))]
+    report('select: scan a topic, %d problems' % size, scan, 200, repeat=1)
+
+
+# The bytes held by an object and everything inside it that isn't in seen,
+# following containers and the attributes of instances. ids are added to
+# seen as they are counted
+def held_size(obj, seen):
+  if id(obj) in seen or isinstance(obj, UNCOUNTED_TYPES):
+    return 0
+  seen.add(id(obj))
+  size = sys.getsizeof(obj)
+  if isinstance(obj, (list, tuple, set, frozenset)):
+    size += sum(held_size(value, seen) for value in obj)
+  elif isinstance(obj, dict):
+    size += sum(held_size(key, seen) + held_size(value, seen)
+                for key, value in obj.iteritems())
+  elif hasattr(obj, '__dict__'):
+    size += held_size(obj.__dict__, seen)
+  return size
+
+# Code and the like, which a call uses but doesn't make
+UNCOUNTED_TYPES = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+                   types.MethodType, types.ClassType, type, types.FrameType)
+
+# Roughly what one call of func(arg) allocates. Python 2 has no
+# tracemalloc, so this is not allocation tracking: a tracer stops at every
+# line the call runs and adds up the bytes reachable from the local
+# variables of its frames, leaving out whatever existed before the call
+# began, such as the module's own tables. Objects made and dropped
+# between two lines are never seen.
+# Return: (the most bytes held at once, the number of distinct objects seen)
+def call_allocations(func, arg, existing):
+  state = {'peak': 0, 'objects': set()}
+  caller = sys._getframe()
+  def measure(frame):
+    seen = set(existing)
+    held = 0
+    while frame is not None and frame is not caller:
+      for value in frame.f_locals.itervalues():
+        held += held_size(value, seen)
+      frame = frame.f_back
+    state['peak'] = max(state['peak'], held)
+    state['objects'].update(seen - existing)
+  def trace(frame, event, argument):
+    if event in ('line', 'return'):
+      measure(frame)
+    return trace
+  sys.settrace(trace)
+  try:
+    func(arg)
+  except (SystemExit, Exception):
+    pass # The original parser exits on answers it can't read
+  finally:
+    sys.settrace(None)
+  return state['peak'], len(state['objects'])
+
+# Measures the memory that interpret needs per call, now and in the
+# original Term parser kept in baseline_interpreter.py: the most bytes its
+# working values hold at once, and roughly how many objects it makes along
+# the way, both sampled by call_allocations
+def bench_memory(n=300):
+  import baseline_interpreter
+  corpus = answer_corpus(n)
+  print 'memory: sampled bytes reachable from frame locals at each line,',
+  print 'not allocation tracking'
+  for name, module in [('current', AnswerInterpreter),
+                       ('baseline Term parser', baseline_interpreter)]:
+    existing = set()
+    held_size(module.__dict__, existing)
+    peak = objects = 0
+    for q in corpus:
+      held, made = call_allocations(module.interpret, q, existing | set([id(q)]))
+      peak += held
+      objects += made
+    label = 'memory: interpret (%s)' % name
+    print '%-40s %8.1f peak sampled bytes %6.1f objects seen per call' % (
+      label, float(peak)/n, float(objects)/n)
+    results[label] = {'peak_bytes': float(peak)/n, 'objects': float(objects)/n}
+
+
+
+BENCHMARKS = {
+  'accepted': bench_accepted,
+  'bank': bench_bank,
+  'cache': bench_cache,
+  'construct': bench_construct,
+  'expression': bench_expression,
+  'grade': bench_grade,
+  'interpret': bench_interpret,
+  'log': bench_log,
+  'memory': bench_memory,
+  'parallel': bench_parallel,
+  'profile': bench_profile,
+  'render': bench_render,
+  'select': bench_select,
+  'stream': bench_stream,
+  'unordered': bench_unordered,
+  'worksheets': bench_worksheets,
+}
+
+# Compares this run against saved results. Anything that got slower, or
+# used more memory, by more than tolerance (a fraction) is flagged
+# Return: The number of regressions
+def compare(baseline, tolerance):
+  regressions = 0
+  for name in sorted(results):
+    if name not in baseline:
+      continue
+    for key, worse in [('ops_per_sec', lambda old, new: new < old*(1 - tolerance)),
+                       ('peak_kb', lambda old, new: new > old*(1 + tolerance) and new - old > 1024),
+                       ('peak_bytes', lambda old, new: new > old*(1 + tolerance)),
+                       ('objects', lambda old, new: new > old*(1 + tolerance))]:
+      if key not in results[name] or key not in baseline[name]:
+        continue
+      old = baseline[name][key]
+      new = results[name][key]
+      change = 100.0*(new - old)/old if old else 0
+      flag = worse(old, new)
+      regressions += flag
+      print '%-40s %-12s %12.0f -> %12.0f %+7.1f%% %s' % (
+        name, key, old, new, change, 'REGRESSION' if flag else '')
+  return regressions
+
+# Runs one benchmark in a forked child process and returns its results.
+# Peak RSS only ever grows, so in a single process every benchmark after
+# the hungriest would show no growth at all. A child starts counting from
+# where it was forked, so each benchmark's peak is its own
+def run_isolated(name):
+  read_fd, write_fd = os.pipe()
+  sys.stdout.flush()
+  pid = os.fork()
+  if pid == 0:
+    os.close(read_fd)
+    status = 1
+    try:
+      results.clear()
+      before = peak_memory()
+      BENCHMARKS[name]()
+      growth = peak_memory() - before
+      print '%-40s %10d KB peak memory growth' % (name, growth)
+      results[name] = {'peak_kb': growth}
+      with os.fdopen(write_fd, 'w') as f:
+        json.dump(results, f)
+      status = 0
+    except BaseException:
+      traceback.print_exc()
+    finally:
+      sys.stdout.flush()
+      os._exit(status)
+  os.close(write_fd)
+  with os.fdopen(read_fd) as f:
+    output = f.read()
+  os.waitpid(pid, 0)
+  if not output:
+    print '%-40s failed' % name
+    return {}
+  return json.loads(output)
+
+def main():
+  parser = argparse.ArgumentParser(description='Times the problem set framework.')
+  parser.add_argument('names', nargs='*', help='benchmarks to run: ' + 
+                      ', '.join(sorted(BENCHMARKS)) + ' (default: all)')
+  parser.add_argument('--save', metavar='FILE', help='save the results as a baseline')
+  parser.add_argument('--compare', metavar='FILE', help='compare against a saved baseline')
+  parser.add_argument('--tolerance', type=float, default=0.2,
+                      help='fraction a result may get worse before it is flagged')
+  args = parser.parse_args()
+
+  for name in args.names or sorted(BENCHMARKS):
+    results.update(run_isolated(name))
+
+  if args.save:
+    with open(args.save, 'w') as f:
+      json.dump(results, f, indent=2, sort_keys=True)
+  if args.compare:
+    with open(args.compare) as f:
+      baseline = json.load(f)
+    print
+    if compare(baseline, args.tolerance):
+      sys.exit(1)
+
+if __name__ == "__main__":
+  main()
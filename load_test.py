@@ -0,0 +1,131 @@
+'''
+Chet Gnegy
+chetgnegy@gmail.com
+
+Simulates a crowd of students taking a quiz from QuizServer
+
+
+
+The MIT License (MIT)
+
+Copyright (c) 2014 Chet Gnegy
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import time
+import random
+import socket
+import asyncore
+import asynchat
+import argparse
+import multiprocessing
+
+# Answers of the sort students type in. The last one can't be read, so
+# the server asks the question again
+ANSWERS = ['-1', '1+j', '0.5-0.866j', '3/4 - 2j', '(1+j)(1-j)', '-j', '2 +']
+
+# One simulated student. Answers every question as soon as it arrives and
+# times how long each verdict takes to come back
+class Student(asynchat.async_chat):
+  def __init__(self, host, port, results, rand):
+    asynchat.async_chat.__init__(self)
+    self.set_terminator('\n')
+    self.results = results
+    self.rand = rand
+    self.incoming = []
+    self.sent_at = None
+    self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.connect((host, port))
+
+  def handle_connect(self):
+    pass
+
+  def collect_incoming_data(self, data):
+    self.incoming.append(data)
+
+  def found_terminator(self):
+    line = ''.join(self.incoming)
+    self.incoming = []
+    if line.startswith('Q '):
+      count = int(line.split(' ', 3)[2])
+      self.sent_at = time.time()
+      self.push(''.join(self.rand.choice(ANSWERS) + '\n' for i in range(count)))
+    elif line in ('CORRECT', 'INCORRECT', 'INVALID'):
+      self.results['latencies'].append(time.time() - self.sent_at)
+    elif line.startswith('DONE'):
+      self.results['finished'] += 1
+      self.close()
+
+  def handle_error(self):
+    self.results['errors'] += 1
+    self.close()
+
+def percentile(ordered, fraction):
+  return ordered[min(len(ordered) - 1, int(fraction*len(ordered)))]
+
+# Runs a QuizServer over the sample problem set
+def run_server(port, processes):
+  from QuizServer import QuizServer
+  from sample_problem_set import prepareHW
+  random.seed(0)
+  QuizServer(prepareHW(), port=port, processes=processes).serve_forever()
+
+def main():
+  parser = argparse.ArgumentParser(description='Load tests a QuizServer.')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8765)
+  parser.add_argument('--sessions', type=int, default=1000,
+                      help='number of students taking the quiz at once')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--serve', action='store_true',
+                      help='start a server over the sample problem set first')
+  parser.add_argument('--processes', type=int, default=None,
+                      help='grading processes for the server started by --serve')
+  args = parser.parse_args()
+
+  server = None
+  if args.serve:
+    server = multiprocessing.Process(target=run_server, args=(args.port, args.processes))
+    server.start()
+    time.sleep(1) # Give it time to start listening
+
+  rand = random.Random(args.seed)
+  results = {'latencies': [], 'finished': 0, 'errors': 0}
+  start = time.time()
+  try:
+    for i in range(args.sessions):
+      Student(args.host, args.port, results, random.Random(rand.random()))
+    asyncore.loop(use_poll=True)
+  finally:
+    if server is not None:
+      server.terminate()
+  elapsed = time.time() - start
+
+  latencies = sorted(results['latencies'])
+  print '%d of %d sessions finished, %d errors, in %.1f seconds' % (
+    results['finished'], args.sessions, results['errors'], elapsed)
+  if latencies:
+    print '%d answers graded (%.0f per second)' % (len(latencies), len(latencies)/elapsed)
+    print 'latency ms: p50 %.1f  p90 %.1f  p99 %.1f  max %.1f' % tuple(
+      1000*x for x in [percentile(latencies, 0.5), percentile(latencies, 0.9),
+                       percentile(latencies, 0.99), latencies[-1]])
+
+if __name__ == "__main__":
+  main()
@@ -35,6 +35,24 @@ from cmath import *
 from ProblemSet import *
 
 from AnswerInterpreter import * 
+from AnswerExpression import AnswerKey
+from AnswerMatcher import AnswerSet
+
+# Answer keys worked out from each problem's data when it is first checked
+QUADRATIC_ROOTS = AnswerKey(['(-%1 + sqrt(%1^2 - 4%0%2)) / (2%0)',
+                             '(-%1 - sqrt(%1^2 - 4%0%2)) / (2%0)'])
+PHASE = AnswerKey(['phase(%0)'])
+RECIPROCAL_POLAR = AnswerKey(['abs(1/%0)', 'phase(1/%0)'])
+
+# Phases are accepted modulo 2pi. On the negative real axis the key could
+# be pi or -pi, depending on the sign of a zero imaginary part, and a
+# student may give either
+def phase_answer(data):
+  return [AnswerSet(PHASE(data), period=2*pi)]
+
+def reciprocal_polar_answer(data):
+  magnitude, angle = RECIPROCAL_POLAR(data)
+  return [magnitude, AnswerSet([angle], period=2*pi)]
 
 def prepareHW():
   prob = {}
@@ -53,8 +71,7 @@ def prepareHW():
 
 
   for i in [1,2,3,5]:
-    prob[i].answer = [( -prob[i].data[1] + sqrt(prob[i].data[1]*prob[i].data[1] - 4*prob[i].data[0]*prob[i].data[2]))/(2*prob[i].data[0]),
-                      ( -prob[i].data[1] - sqrt(prob[i].data[1]*prob[i].data[1] - 4*prob[i].data[0]*prob[i].data[2]))/(2*prob[i].data[0]) ]
+    prob[i].answer = QUADRATIC_ROOTS
   prob[4].answer = [-1, -1, 0]
  
 
@@ -62,29 +79,29 @@ def prepareHW():
       prob[i] = Problem()
       prob[i].ordering_counts = False # Roots can be entered in any order
       prob[i].data = [complex(randint(-10, 10), randint(-10, 10))]
-      while abs(prob[i] == 0):
+      while prob[i].data[0] == 0:
         prob[i].data = [complex(randint(-10, 10), randint(-10, 10))]
     
   prob[7].question = "What is the real part of %0?"
-  prob[7].answer = [prob[7].data[0].real]
+  prob[7].answer = AnswerKey(['re(%0)'])
   
   prob[8].question = "What is the imaginary part of %0?"
-  prob[8].answer = [prob[8].data[0].imag]
+  prob[8].answer = AnswerKey(['im(%0)'])
   
   prob[9].question = "What is the modulus (magnitude) of %0?"
-  prob[9].answer = [abs(prob[9].data[0])]
+  prob[9].answer = AnswerKey(['abs(%0)'])
   
   prob[10].question = "What is the phase of %0?"
-  prob[10].answer = [phase(prob[10].data[0])]
+  prob[10].answer = phase_answer
   
   prob[11].question = "What is the complex conjugate of %0?"
-  prob[11].answer = [prob[11].data[0].real - complex(0,1)*prob[11].data[0].imag]
+  prob[11].answer = AnswerKey(['conj(%0)'])
   
   prob[12].question = "What is the reciporical in rectangular form of %0?"
-  prob[12].answer = [(1/(prob[12].data[0]))]
+  prob[12].answer = AnswerKey(['1/%0'])
   
   prob[13].question = "What is the reciporical in polar form of %0? (Enter the magnitude then the phase)"
-  prob[13].answer = [abs(1/(prob[13].data[0])),phase(1/(prob[13].data[0]))]
+  prob[13].answer = reciprocal_polar_answer
     
 
 
@@ -92,18 +109,57 @@ def prepareHW():
 
 
 
+# Yields count different quadratics with random integer coefficients
+def quadratic_variants(count, seed=0):
+  import numpy
+  from ProblemGenerator import ProblemGenerator
+
+  def sample(rand, size):
+    return numpy.column_stack([rand.randint(1, 11, size),
+                               rand.randint(-10, 11, size),
+                               rand.randint(-10, 11, size)])
+  generator = ProblemGenerator("What are the roots of %0x^2 + %1x + %2?",
+                               sample, QUADRATIC_ROOTS)
+  return generator.generate(count, seed)
+
 
 
 
 
 
+
+
+# The topic of each problem in prepareHW and a rough guess at how hard it
+# is, for ProblemSelector
+TOPICS = {1: 'polynomials', 2: 'polynomials', 3: 'polynomials', 4: 'polynomials',
+          5: 'polynomials', 7: 'complex numbers', 8: 'complex numbers',
+          9: 'complex numbers', 10: 'complex numbers', 11: 'complex numbers',
+          12: 'complex numbers', 13: 'complex numbers'}
+DIFFICULTY = {1: -1.0, 2: -0.5, 3: 0.5, 4: 1.0, 5: 1.5, 7: -1.5, 8: -1.5,
+              9: -0.5, 10: 0.5, 11: -1.0, 12: 1.0, 13: 1.5}
+
 def main():
   prob = prepareHW()
-
-  for i in prob:
+  keys = sorted(prob)
+  try:
+    from ProblemSelector import ProblemSelector
+  except ImportError: # ProblemSelector needs numpy
+    # Asks every problem in order instead
+    for i in keys:
+      prob[i].ask()
+      print "DEBUG:", prob[i].answer_key()
+      prob[i].poll_for_responses()
+    return
+  selector = ProblemSelector([TOPICS[i] for i in keys],
+                             [DIFFICULTY[i] for i in keys], keys=keys)
+
+  # Asks whatever suits the student best next, until every problem is done
+  i = selector.next_problem('you')
+  while i is not None:
     prob[i].ask()
-    print "DEBUG:", prob[i].answer
-    prob[i].poll_for_responses()
+    print "DEBUG:", prob[i].answer_key()
+    selector.record('you', i, prob[i].poll_for_responses() == True)
+    i = selector.next_problem('you')
 
  
   